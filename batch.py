@@ -0,0 +1,110 @@
+import csv, os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from engine import OptimizationEngine, Reference, load_tree, load_reference, save_tree
+from heatmap import NumPyGreyHeatmapper
+from heatmap_renderer import HeatmapRenderer, get_renderer, set_renderer
+
+RESULTS_FILE = "results.csv"
+
+# Результат оптимизации одного тестируемого интерфейса: output - JSON файл с лучшим вариантом,
+# error - описание ошибки, если оптимизация не удалась (тогда best_ff_value и count_iterations равны None)
+BatchResult = namedtuple('BatchResult', ['target', 'output', 'best_ff_value', 'count_iterations', 'error'])
+
+# Подготовленный эталон и параметры оптимизации процесса-исполнителя (задаются один раз при его запуске)
+_reference = None
+_options = None
+
+
+def _init_worker(reference, options, grey_heatmapper):
+    """ Функция, запоминающая эталон и параметры оптимизации в процессе-исполнителе """
+    global _reference, _options
+    _reference = reference
+    _options = options
+    set_renderer(HeatmapRenderer(grey_heatmapper=grey_heatmapper))
+
+
+def _optimize(target_file, output_file, algorithm):
+    """
+    Функция, оптимизирующая в процессе-исполнителе один тестируемый интерфейс и сохраняющая лучший вариант
+    :return: лучшее значение фитнесс-функции и количество итераций
+    """
+    engine = OptimizationEngine(None, load_tree(target_file), _reference.width, _reference.height,
+                                reference=_reference, **_options)
+    save_tree(engine.run(algorithm), output_file)
+    return engine.best_ff_value, engine.count_iterations
+
+
+def get_output_files(target_files, output_dir):
+    """
+    Функция, назначающая каждому тестируемому интерфейсу JSON файл результата в каталоге output_dir:
+    имя файла интерфейса (без расширения), при совпадении имён - с порядковым номером
+    """
+    output_files = []
+    used = set()
+    for target_file in target_files:
+        name = os.path.splitext(os.path.basename(target_file))[0]
+        number = 1
+        output_name = name
+        while output_name in used:
+            number += 1
+            output_name = "{}-{}".format(name, number)
+        used.add(output_name)
+        output_files.append(os.path.join(output_dir, output_name + ".json"))
+    return output_files
+
+
+def save_results(results, file_name):
+    """ Функция, сохраняющая результаты пакетной оптимизации в CSV файл (по строке на тестируемый интерфейс) """
+    with open(file_name, "w", newline="") as results_file:
+        writer = csv.writer(results_file)
+        writer.writerow(BatchResult._fields)
+        writer.writerows(results)
+
+
+def run_batch(reference_file, target_files, output_dir, width, height, algorithm="ga", workers=None,
+              on_result=None, reference_cache=None, **options):
+    """
+    Функция, оптимизирующая несколько тестируемых интерфейсов по одному эталонному: тепловая карта и энергия
+    эталона вычисляются один раз и передаются каждому процессу пула при запуске, тестируемые интерфейсы
+    распределяются между процессами. Лучший вариант каждого интерфейса сохраняется в output_dir, а значения
+    фитнесс-функции всех интерфейсов - в output_dir/RESULTS_FILE
+    :param reference_file: JSON файл или двоичный снимок эталонного интерфейса
+    :param target_files: JSON файлы или двоичные снимки тестируемых интерфейсов
+    :param workers: количество процессов (по умолчанию - количество ядер процессора)
+    :param on_result: функция, вызываемая по завершении оптимизации каждого интерфейса: on_result(BatchResult)
+    :param reference_cache: ReferenceCache - эталон берётся из постоянного кэша (файл reference_cache.py)
+    :param options: параметры OptimizationEngine (fitness, population_size, elitism, ...)
+    :return: список BatchResult в порядке target_files
+    """
+    fitness_modes = (options.get("fitness", "heatmap"),)
+    if reference_cache is not None:
+        reference = reference_cache.get_reference(reference_file, width, height, fitness_modes)
+    else:
+        reference = Reference.from_tree(load_reference(reference_file), width, height, fitness_modes)
+    os.makedirs(output_dir, exist_ok=True)
+    output_files = get_output_files(target_files, output_dir)
+
+    # Процессы строят тепловые карты той же реализацией GreyHeatMapper, что и основной процесс
+    numpy_heatmapper = isinstance(get_renderer().heatmapper.grey_heatmapper, NumPyGreyHeatmapper)
+    results = [None] * len(target_files)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(reference, options, 'NumPy' if numpy_heatmapper else 'PIL')) as executor:
+        futures = {executor.submit(_optimize, target_file, output_file, algorithm): index
+                   for index, (target_file, output_file) in enumerate(zip(target_files, output_files))}
+        for future in as_completed(futures):
+            index = futures[future]
+            # Ошибка в одном интерфейсе не прерывает оптимизацию остальных
+            try:
+                best_ff_value, count_iterations = future.result()
+                results[index] = BatchResult(target_files[index], output_files[index], best_ff_value,
+                                             count_iterations, None)
+            except Exception as error:
+                results[index] = BatchResult(target_files[index], None, None, None,
+                                             "{}: {}".format(type(error).__name__, error))
+            if on_result:
+                on_result(results[index])
+
+    save_results(results, os.path.join(output_dir, RESULTS_FILE))
+    return results
@@ -3,15 +3,21 @@ import random
 
 MOVE_CHANCE = 0.3
 
+# Параметры алгоритма искусственной пчелиной колонии (Bees.cycle)
+FOOD_SOURCES_COUNT = 10  # количество источников нектара (= рабочих пчёл = пчёл-наблюдателей)
+TRIAL_LIMIT = 10  # количество неудачных попыток улучшения, после которого источник покидается
+
 
 class Bees(PopulationAlgorithms):
     """
-    Класс, реализующий алгоритм пчелиной колонии
+    Класс, реализующий алгоритм искусственной пчелиной колонии (ABC): популяция источников нектара (вариантов
+    расположения элементов), фазы рабочих пчёл, пчёл-наблюдателей и разведчиков
     """
     def move_bees(self, tree, chance=MOVE_CHANCE):
         """
         Функция, выполняющая перемещение агентов популяции (случайное изменение положения элементов дерева)
         Используется в алгоритмах пчелиной колонии и поиска системой зарядов
+        Изменяемые узлы копируются, поэтому копии дерева tree (Tree.copy) не затрагиваются
         """
         def move(element):
             if len(element.children) > 1:
@@ -23,7 +29,7 @@ class Bees(PopulationAlgorithms):
                         index2 = random.randint(0, len(element.children)-1)
                     # Меняем местрами элементы с установленными номерами, если это не пункты меню li
                     if not (element.children[index1].tag_name == "li" and element.children[index2].tag_name == "li"):
-                        self.change_elements(element, index1, index2)
+                        element = self.change_elements(element, index1, index2, tree)
 
             for child in element.children:
                 move(child)
@@ -31,6 +37,100 @@ class Bees(PopulationAlgorithms):
         # Вызываем внутреннюю функцию, передавая ей корень дерева
         move(tree.root)
 
+    def initial_sources(self, tree, count=FOOD_SOURCES_COUNT):
+        """
+        Функция, формирующая начальные источники нектара: исходное дерево и его случайно изменённые копии
+        :return: список деревьев размером count
+        """
+        sources = [tree]
+        while len(sources) < count:
+            source = tree.copy()
+            self.move_bees(source)
+            sources.append(source)
+        return sources
+
+    def neighbour(self, source, partner, movable_elements):
+        """
+        Функция, формирующая соседний с source источник нектара: у случайного узла дочерние элементы принимают
+        расположение из источника partner (шаг к партнёру по одному измерению), а если оно совпадает -
+        два случайных дочерних элемента меняются местами
+        :param movable_elements: идентификаторы узлов, дочерние элементы которых можно перемещать
+        :return: новое дерево (source не изменяется)
+        """
+        tree = source.copy()
+        if not movable_elements:
+            return tree
+
+        identifier = random.choice(movable_elements)
+        if not self.take_children_positions(tree, identifier, partner):
+            # Меняем местами два случайных дочерних элемента, если это не два пункта меню li
+            element = tree.get_node(identifier)
+            index1, index2 = random.sample(range(len(element.children)), 2)
+            while element.children[index1].tag_name == "li" and element.children[index2].tag_name == "li":
+                index1, index2 = random.sample(range(len(element.children)), 2)
+            self.change_elements(element, index1, index2, tree)
+
+        return tree
+
+    def cycle(self, sources, ff_values, trials, start_tree, scale_x, scale_y, width, height, destination_heatmap,
+              iteration, trial_limit=TRIAL_LIMIT, ff_cache=None, ff_pool=None, heatmap_trackers=None):
+        """
+        Функция, выполняющая один цикл алгоритма искусственной пчелиной колонии. Все новые варианты цикла
+        оцениваются одним пакетом (estimate_ff_values):
+        1. Разведчики: источники, не улучшавшиеся более trial_limit попыток (кроме лучшего), заменяются случайно
+           изменёнными копиями start_tree (исходного тестируемого интерфейса)
+        2. Рабочие пчёлы: для каждого источника строится соседний вариант (neighbour) со случайным партнёром
+        3. Пчёлы-наблюдатели: выбирают источники с вероятностью, пропорциональной 1 / (1 + FF), и строят соседние
+           варианты выбранных источников
+        4. Жадный отбор: источник заменяется соседним вариантом, если тот лучше, иначе счётчик попыток растёт
+        :param ff_values: значения фитнесс-функции источников sources
+        :param trials: количество неудачных попыток улучшения каждого источника
+        :param heatmap_trackers: HeatmapTracker каждого источника - варианты источника оцениваются его трекером, то есть
+                                 перерисовываются только области элементов, перемещённых относительно источника
+        :return: новые источники, значения фитнесс-функции и счётчики попыток
+        """
+        sources, ff_values, trials = list(sources), list(ff_values), list(trials)
+        movable_elements = self.get_movable_elements(start_tree)
+        best_index = ff_values.index(min(ff_values))
+
+        candidates = []
+        # 1. Разведчики
+        scouts = [index for index in range(len(sources)) if trials[index] > trial_limit and index != best_index]
+        for index in scouts:
+            scout = start_tree.copy()
+            self.move_bees(scout)
+            candidates.append((index, scout))
+        employed = [index for index in range(len(sources)) if index not in scouts]
+
+        # 2. Рабочие пчёлы (партнёр - любой другой источник)
+        for index in employed:
+            partner = random.choice([other for other in range(len(sources)) if other != index] or [index])
+            candidates.append((index, self.neighbour(sources[index], sources[partner], movable_elements)))
+
+        # 3. Пчёлы-наблюдатели (меньшее значение фитнесс-функции - лучше)
+        if employed:
+            weights = [1 / (1 + ff_values[index]) for index in employed]
+            for index in random.choices(employed, weights=weights, k=len(sources)):
+                partner = random.choice([other for other in range(len(sources)) if other != index] or [index])
+                candidates.append((index, self.neighbour(sources[index], sources[partner], movable_elements)))
+
+        candidates_trackers = [heatmap_trackers[index] for index, tree in candidates] if heatmap_trackers else None
+        candidates_ff_values = self.estimate_ff_values([tree for index, tree in candidates], scale_x, scale_y,
+                                                       width, height, destination_heatmap, iteration,
+                                                       ff_cache, ff_pool, candidates_trackers)
+
+        # 4. Жадный отбор (разведчики занимают покинутые источники без сравнения)
+        for (index, tree), ff_value in zip(candidates, candidates_ff_values):
+            if index in scouts:
+                sources[index], ff_values[index], trials[index] = tree, ff_value, 0
+            elif ff_value < ff_values[index]:
+                sources[index], ff_values[index], trials[index] = tree, ff_value, 0
+            else:
+                trials[index] += 1
+
+        return sources, ff_values, trials
+
+
 
 
 
@@ -1,35 +1,184 @@
 from population_algorithms import PopulationAlgorithms
+from fitness_functions import FitnessFunctions, FitnessCache
 import random
+import numpy
 
 MOVE_CHANCE = 0.3
 
+# Параметры поиска системой зарядов (Charges.iteration)
+CHARGES_COUNT = 10  # количество заряженных частиц (вариантов расположения элементов)
+MEMORY_SIZE = 3  # количество лучших найденных вариантов в памяти зарядов
+ATTRACTION_CHANCE = 0.5  # шанс притяжения частицы к одному из лучших вариантов
+
 
 class Charges(PopulationAlgorithms):
     """
-    Класс, реализующий алгоритм поиска системой зарядов
+    Класс, реализующий алгоритм поиска системой зарядов: популяция заряженных частиц (вариантов расположения
+    элементов) притягивается к лучшим вариантам и памяти зарядов, а элементы перемещаются под действием сил
+    взаимодействия зарядов, вычисляемых по той же модели, что и энергия (FitnessFunctions.get_energy).
+    Частицы - варианты расположения элементов типа Layout (файл layout.py): копия частицы - копия массивов координат,
+    перемещение поддерева - сложение со срезом
     """
-    def move_charges(self, tree, chance=MOVE_CHANCE):
-        """
-        Функция, выполняющая перемещение агентов популяции (случайное изменение положения элементов дерева)
-        Используется в алгоритмах пчелиной колонии и поиска системой зарядов
-        """
-        def move(element):
-            if len(element.children) > 1:
-                if chance > random.random():
-                    # Формируем случайные индексы из номеров дочерних узлов
-                    index1 = random.randint(0, len(element.children)-1)
-                    index2 = random.randint(0, len(element.children)-1)
-                    while index1 == index2:
-                        index2 = random.randint(0, len(element.children)-1)
-                    # Меняем местрами элементы с установленными номерами, если это не пункты меню li
-                    if not (element.children[index1].tag_name == "li" and element.children[index2].tag_name == "li"):
-                        self.change_elements(element, index1, index2)
-
-            for child in element.children:
-                move(child)
-
-        # Вызываем внутреннюю функцию, передавая ей корень дерева
-        move(tree.root)
+    def move_charges(self, particle, chance=MOVE_CHANCE):
+        """
+        Функция, выполняющая перемещение заряженной частицы (случайное изменение положения элементов):
+        у каждого узла с несколькими дочерними элементами с шансом chance меняются местами два из них
+        :param particle: вариант расположения элементов типа Layout (изменяется на месте)
+        """
+        particle.mutation(chance)
+
+    def initial_particles(self, layout, count=CHARGES_COUNT):
+        """
+        Функция, формирующая начальные заряженные частицы: исходный вариант расположения и его случайно изменённые
+        копии
+        :param layout: Layout исходного дерева
+        :return: список вариантов расположения типа Layout размером count
+        """
+        particles = [layout]
+        while len(particles) < count:
+            particle = layout.copy()
+            self.move_charges(particle)
+            particles.append(particle)
+        return particles
+
+    @staticmethod
+    def get_movable_indexes(structure):
+        """
+        Функция, возвращающая номера узлов (в порядке обхода в глубину), дочерние элементы которых можно менять
+        местами
+        :param structure: Layout исходного дерева (файл layout.py) - структура общая для всех частиц
+        """
+        return [index for index, children in enumerate(structure.children)
+                if len(children) > 1 and not structure.is_li[children].all()]
+
+    @staticmethod
+    def get_subtree_forces(tree, width, height, structure):
+        """
+        Функция, вычисляющая силы, действующие на поддеревья узлов: при перемещении поддерева на вектор d
+        энергия системы зарядов изменяется на -F * d (силы внутри поддерева взаимно уравновешиваются)
+        :param tree: вариант расположения элементов типа Layout
+        :return: массив зарядов (get_charges) и numpy массив сил размером (n, 2)
+        """
+        charges = FitnessFunctions.get_charges(tree)
+        forces = FitnessFunctions.get_forces(charges, FitnessFunctions.get_charge_values(charges, width, height))
+
+        # Поддерево узла i занимает индексы [i, subtree_end[i]) - сумма по нему через накопленные суммы
+        sums = numpy.vstack((numpy.zeros((1, 2)), numpy.cumsum(forces, axis=0)))
+        return charges, sums[structure.subtree_end] - sums[:len(forces)]
+
+    def force_moves(self, tree, energy, width, height, initial_energy, structure, movable_indexes,
+                    chance=MOVE_CHANCE):
+        """
+        Функция, перемещающая элементы под действием сил: у каждого узла с шансом chance меняются местами два
+        дочерних элемента. Перестановки оцениваются по линейной оценке изменения энергии dE = -(F_i - F_j) * (p_j - p_i)
+        и выбираются тем чаще, чем ближе оценённая энергия к энергии эталонного интерфейса
+        :param tree: вариант расположения элементов типа Layout (изменяется на месте)
+        :param energy: текущая энергия системы зарядов варианта tree
+        :param movable_indexes: номера узлов, дочерние элементы которых можно менять местами (get_movable_indexes)
+        :return: вариант расположения tree
+        """
+        charges, forces = self.get_subtree_forces(tree, width, height, structure)
+
+        for index in movable_indexes:
+            if chance > random.random():
+                children = structure.children[index]
+                positions, children_forces = charges[children, :2], forces[children]
+
+                # Оценка изменения энергии для всех пар дочерних элементов
+                delta = -numpy.sum((children_forces[:, numpy.newaxis] - children_forces[numpy.newaxis, :]) *
+                                   (positions[numpy.newaxis, :] - positions[:, numpy.newaxis]), axis=2)
+                predicted = numpy.abs(energy + delta - initial_energy)
+
+                # Элемент не меняется сам с собой, пункты меню li не меняются между собой
+                is_li = structure.is_li[children]
+                predicted[numpy.eye(len(children), dtype=bool) | (is_li[:, numpy.newaxis] & is_li)] = numpy.inf
+
+                # Перестановка выбирается случайно: вероятность убывает экспоненциально с ростом оценки отклонения
+                # (масштаб - текущее отклонение энергии частицы от энергии эталонного интерфейса)
+                weights = numpy.exp((predicted.min() - predicted.ravel()) / max(abs(energy - initial_energy), 1))
+                i, j = numpy.unravel_index(random.choices(range(len(weights)), weights=weights)[0], predicted.shape)
+                tree.change_elements(index, int(i), int(j))
+                energy += delta[i, j]
+
+        return tree
+
+    @staticmethod
+    def estimate_ff_values_charges(particles, trackers, width, height, initial_energy):
+        """
+        Функция, оценивающая все частицы: энергия каждой частицы пересчитывается её EnergyTracker только для
+        перемещённых зарядов
+        :return: список значений фитнесс-функции в порядке particles
+        """
+        return [FitnessFunctions.get_ff_value_charges(particle, width, height, initial_energy, tracker)
+                for particle, tracker in zip(particles, trackers)]
+
+    @staticmethod
+    def update_memory(memory, particles, ff_values, memory_size=MEMORY_SIZE):
+        """
+        Функция, обновляющая память зарядов - memory_size лучших различных вариантов расположения элементов
+        :param memory: список кортежей (вариант расположения, значение фитнесс-функции)
+        :return: новая память зарядов, отсортированная от лучшего варианта к худшему
+        """
+        new_memory = []
+        keys = set()
+        for tree, ff_value in sorted(memory + list(zip(particles, ff_values)), key=lambda entry: entry[1]):
+            key = FitnessCache.get_layout_key(tree)
+            if key not in keys:
+                keys.add(key)
+                new_memory.append((tree, ff_value))
+            if len(new_memory) == memory_size:
+                break
+        return new_memory
+
+    def iteration(self, particles, ff_values, trackers, memory, width, height, initial_energy, structure,
+                  memory_size=MEMORY_SIZE, chance=MOVE_CHANCE):
+        """
+        Функция, выполняющая одну итерацию поиска системой зарядов:
+        1. Частица с шансом ATTRACTION_CHANCE притягивается к одному из лучших, чем она, вариантов (частиц и памяти
+           зарядов), выбранному с вероятностью, пропорциональной его заряду (FF_worst - FF) / (FF_worst - FF_best):
+           дочерние элементы случайного узла принимают расположение из этого варианта
+        2. Элементы частицы перемещаются под действием сил взаимодействия зарядов (force_moves)
+        3. Все частицы оцениваются одним пакетом; частица остаётся в прежнем положении, если новое хуже,
+           лучшие варианты сохраняются в памяти зарядов
+        :param ff_values: значения фитнесс-функции частиц particles
+        :param particles: частицы - варианты расположения элементов типа Layout
+        :param trackers: EnergyTracker каждой частицы (обновляются вместе с частицами)
+        :param memory: память зарядов (update_memory)
+        :param structure: Layout исходного дерева - структура общая для всех частиц
+        :return: новые частицы, значения фитнесс-функции и память зарядов
+        """
+        movable_indexes = self.get_movable_indexes(structure)
+
+        # Заряды вариантов: лучший - 1, худший - 0
+        guides = list(particles) + [tree for tree, ff_value in memory]
+        guides_ff_values = list(ff_values) + [ff_value for tree, ff_value in memory]
+        best, worst = min(guides_ff_values), max(guides_ff_values)
+
+        new_particles = []
+        for particle, ff_value, tracker in zip(particles, ff_values, trackers):
+            tree = particle.copy()
+            energy = tracker.energy
+
+            # 1. Притяжение к лучшим вариантам
+            better = [index for index, guide_ff_value in enumerate(guides_ff_values) if guide_ff_value < ff_value]
+            if movable_indexes and better and ATTRACTION_CHANCE > random.random():
+                weights = [(worst - guides_ff_values[index]) / (worst - best) for index in better]
+                guide = guides[random.choices(better, weights=weights)[0]]
+                tree.take_children_positions(random.choice(movable_indexes), guide)
+                energy = tracker.update(tree)
+
+            # 2. Перемещение под действием сил
+            new_particles.append(self.force_moves(tree, energy, width, height, initial_energy, structure,
+                                                  movable_indexes, chance))
+
+        # 3. Оценка всех частиц и обновление памяти зарядов
+        new_ff_values = self.estimate_ff_values_charges(new_particles, trackers, width, height, initial_energy)
+        for index, (particle, ff_value, tracker) in enumerate(zip(particles, ff_values, trackers)):
+            if new_ff_values[index] > ff_value:
+                new_particles[index], new_ff_values[index] = particle, ff_value
+                tracker.update(particle)
+        return new_particles, new_ff_values, self.update_memory(memory, new_particles, new_ff_values, memory_size)
+
 
 
 
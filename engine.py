@@ -0,0 +1,422 @@
+import tree_loader
+from snapshot import is_snapshot, load_snapshot
+from ga import GA, POPULATION_SIZE, ELITISM_COUNT, SELECTION, SELECTION_METHODS, TOURNAMENT_SIZE
+from bees import Bees, FOOD_SOURCES_COUNT, TRIAL_LIMIT
+from charges import Charges, CHARGES_COUNT, MEMORY_SIZE
+from fitness_functions import FitnessFunctions, EnergyTracker, HeatmapTracker, FitnessCache
+from fitness_pool import FitnessPool
+from layout import Layout
+from islands import IslandModel, MIGRATION_INTERVAL, MIGRATION_SIZE
+
+MUTATE_CHANCE = 0.3
+MAX_COUNT_ITERATIONS = 99
+MAX_COUNT_USELESS_ITERATIONS = 49
+MAX_FF_DIFFERENCE = 10
+ALGORITHMS = ("ga", "bees", "charges")
+FITNESS_MODES = ("heatmap", "grey")
+
+
+def load_tree(file_name):
+    """
+    Функция, загружающая дерево элементов интерфейса из JSON файла или двоичного снимка (файл snapshot.py)
+    :return: дерево элементов типа Tree (файл node.py)
+    """
+    if is_snapshot(file_name):
+        return load_snapshot(file_name).to_tree()
+    return tree_loader.load_tree(file_name)
+
+
+def load_reference(file_name):
+    """
+    Функция, загружающая эталонный интерфейс: двоичный снимок отображается в память и используется как Layout
+    без создания узлов (для эталона нужны только точки тепловой карты и заряды), JSON файл - как load_tree
+    :return: дерево элементов типа Tree или вариант расположения элементов типа Layout
+    """
+    if is_snapshot(file_name):
+        return load_snapshot(file_name).to_layout()
+    return load_tree(file_name)
+
+
+def get_root_size(tree):
+    """ Функция, возвращающая ширину и высоту корневого элемента дерева Tree или варианта расположения Layout """
+    if isinstance(tree, Layout):
+        return tree.width[0].item(), tree.height[0].item()
+    return tree.root.width, tree.root.height
+
+
+def save_tree(tree, file_name):
+    """
+    Функция, сохраняющая дерево элементов интерфейса в JSON файл того же формата, что и входные файлы
+    :param tree: дерево элементов типа Tree
+    :param file_name: путь к создаваемому JSON файлу
+    """
+    tree_loader.save_tree(tree, file_name)
+
+
+class Reference:
+    """
+    Класс, описывающий подготовленный к оценке эталонный интерфейс: тепловая карта (или поле интенсивности тепла)
+    и энергия системы зарядов вычисляются один раз и используются всеми OptimizationEngine с тем же эталоном и
+    холстом. Дерево элементов не сохраняется, поэтому в другие процессы передаются только готовые массивы
+    """
+    def __init__(self, width, height, scale_x, scale_y, destination_heatmaps, energy):
+        """
+        :param scale_x: коэффициент пропорциональности реальных размеров и размеров холста по оси x
+        :param scale_y: коэффициент пропорциональности реальных размеров и размеров холста по оси y
+        :param destination_heatmaps: словарь {способ сравнения: тепловая карта или поле интенсивности тепла}
+        :param energy: энергия системы зарядов эталонного интерфейса
+        """
+        self.width = width
+        self.height = height
+        self.scale_x = scale_x
+        self.scale_y = scale_y
+        self.destination_heatmaps = destination_heatmaps
+        self.energy = energy
+
+    @staticmethod
+    def from_tree(initial_tree, width, height, fitness_modes=FITNESS_MODES):
+        """
+        Функция, подготавливающая эталонный интерфейс к оценке
+        :param initial_tree: дерево элементов эталонного интерфейса (Tree или Layout)
+        :param fitness_modes: способы сравнения тепловых карт, для которых строится эталонная карта (FITNESS_MODES)
+        :return: Reference
+        """
+        # Коэффициенты пропорциональности реальных размеров и размеров холста (2px = границы, как на graphicsView)
+        initial_width, initial_height = get_root_size(initial_tree)
+        scale_x = initial_width / (width - 2)
+        scale_y = initial_height / (height - 2)
+
+        # Тепловая карта или поле интенсивности для каждого способа сравнения
+        destination_heatmaps = {}
+        for fitness in fitness_modes:
+            if fitness == "grey":
+                destination_heatmaps[fitness] = FitnessFunctions.get_grey_field(initial_tree, scale_x, scale_y,
+                                                                                width, height)
+            elif fitness == "heatmap":
+                destination_heatmaps[fitness] = FitnessFunctions.get_heatmap(initial_tree, scale_x, scale_y,
+                                                                             width, height)
+            else:
+                raise ValueError("Unknown fitness mode: {}".format(fitness))
+
+        return Reference(width, height, scale_x, scale_y, destination_heatmaps,
+                         FitnessFunctions.get_energy(initial_tree, width, height))
+
+
+class OptimizationEngine:
+    """
+    Класс, выполняющий оптимизацию интерфейса выбранным алгоритмом без графического интерфейса:
+    хранит эталонную тепловую карту и энергию, считает значения фитнесс-функции и проверяет условия окончания
+    """
+    def __init__(self, initial_tree, optimized_tree, width, height, fitness="heatmap", processes=1,
+                 population_size=None, elitism=ELITISM_COUNT, selection=SELECTION, tournament_size=TOURNAMENT_SIZE,
+                 food_sources=FOOD_SOURCES_COUNT, trial_limit=TRIAL_LIMIT, charges_count=CHARGES_COUNT,
+                 memory_size=MEMORY_SIZE, islands=1, migration_interval=MIGRATION_INTERVAL,
+                 migration_size=MIGRATION_SIZE, reference=None):
+        """
+        :param initial_tree: дерево элементов эталонного интерфейса (Tree или Layout, например, из load_reference)
+        :param optimized_tree: дерево элементов оптимизируемого интерфейса
+        :param width: ширина холста, на котором строятся тепловые карты
+        :param height: высота холста, на котором строятся тепловые карты
+        :param fitness: "heatmap" - сравнение раскрашенных тепловых карт (как в графическом интерфейсе),
+                        "grey" - сравнение полей интенсивности тепла без раскраски и наложения на фон
+        :param processes: количество процессов для параллельной оценки потомков ГА и вариантов пчелиной колонии
+                          (1 - без пула процессов)
+        :param population_size: размер популяции ГА (GA.generation); None - исходный ГА с 3 родителями (GA.evolution)
+        :param elitism: количество лучших особей, переходящих в следующее поколение без изменений
+        :param selection: способ выбора родителей - "tournament" | "rank"
+        :param tournament_size: количество особей в турнире
+        :param food_sources: количество источников нектара алгоритма пчелиной колонии
+        :param trial_limit: количество неудачных попыток улучшения, после которого источник нектара покидается
+        :param charges_count: количество заряженных частиц алгоритма поиска системой зарядов
+        :param memory_size: количество лучших вариантов в памяти зарядов
+        :param islands: количество островов ГА, каждый со своей популяцией в отдельном процессе (1 - без островов)
+        :param migration_interval: количество поколений между миграциями лучших особей на соседний остров
+        :param migration_size: количество особей, переходящих с острова на соседний при миграции
+        :param reference: уже подготовленный Reference эталонного интерфейса (тогда initial_tree может быть None)
+        """
+        if fitness not in FITNESS_MODES:
+            raise ValueError("Unknown fitness mode: {}".format(fitness))
+        if selection not in SELECTION_METHODS:
+            raise ValueError("Unknown selection method: {}".format(selection))
+        if population_size is not None and not 0 <= elitism < population_size:
+            raise ValueError("Elitism count must be less than the population size")
+        if food_sources < 1:
+            raise ValueError("At least one food source is required")
+        if charges_count < 1 or memory_size < 1:
+            raise ValueError("At least one charged particle and one memory slot are required")
+        if islands < 1 or migration_interval < 1:
+            raise ValueError("At least one island and one generation between migrations are required")
+        if islands > 1 and not 0 <= migration_size < (population_size or POPULATION_SIZE):
+            raise ValueError("Migration size must be less than the population size")
+        if reference is not None and ((reference.width, reference.height) != (width, height) or
+                                      fitness not in reference.destination_heatmaps):
+            raise ValueError("The prepared reference does not match the canvas size or the fitness mode")
+
+        self.fitness = fitness
+        self.initial_tree = initial_tree
+        self.optimized_tree = optimized_tree
+        self.best_tree = optimized_tree.copy()
+        self.width = width
+        self.height = height
+        self.processes = processes
+        self.population_size = population_size
+        self.elitism = elitism
+        self.selection = selection
+        self.tournament_size = tournament_size
+        self.food_sources = food_sources
+        self.trial_limit = trial_limit
+        self.charges_count = charges_count
+        self.memory_size = memory_size
+        self.islands = islands
+        self.migration_interval = migration_interval
+        self.migration_size = migration_size
+
+        # Тепловая карта (или поле интенсивности) и энергия системы зарядов эталонного интерфейса вычисляются один раз
+        if reference is None:
+            reference = Reference.from_tree(initial_tree, width, height, (fitness,))
+        self.reference = reference
+        self.destination_heatmap = reference.destination_heatmaps[fitness]
+        self.initial_energy = reference.energy
+
+        # Коэффициенты пропорциональности реальных размеров и размеров холста (2px = границы, как на graphicsView)
+        self.initial_scale_x = reference.scale_x
+        self.initial_scale_y = reference.scale_y
+        self.optimized_scale_x = optimized_tree.root.width / (width - 2)
+        self.optimized_scale_y = optimized_tree.root.height / (height - 2)
+
+        # Энергия (алгоритм зарядов) и поле интенсивности тепла (алгоритм пчелиной колонии в одном процессе,
+        # fitness="grey" и NumPyGreyHeatmapper) оптимизируемого дерева пересчитываются только для перемещённых элементов
+        self.energy_tracker = None
+        self.heatmap_tracker = None
+
+        # Значения фитнесс-функции уже оценённых вариантов расположения элементов (по тепловым картам)
+        self.ff_cache = FitnessCache()
+
+        # Параметры оптимизации
+        self.count_iterations = 0
+        self.count_useless_iterations = 0
+        self.best_ff_value = 0
+        self.current_ff_value = 0
+
+        # Текущее поколение ГА (родители исходного ГА или популяция GA.generation), источники нектара или частицы
+        self.population = None
+
+        # Функция, вызываемая после каждого поколения: on_generation(engine, algorithm)
+        self.on_generation = None
+
+    def get_ff_value(self, tree, algorithm):
+        """ Функция, вычисляющая значение фитнесс-функции дерева для выбранного алгоритма """
+        if algorithm == "ga" or algorithm == "bees":
+            return FitnessFunctions.estimate_ff_value(tree, self.optimized_scale_x, self.optimized_scale_y,
+                                                      self.width, self.height, self.destination_heatmap,
+                                                      self.count_iterations, self.heatmap_tracker, self.ff_cache)
+        return FitnessFunctions.get_ff_value_charges(tree, self.width, self.height, self.initial_energy,
+                                                     self.energy_tracker)
+
+    def reset(self, algorithm):
+        """ Функция, обнуляющая статистику перед запуском выбранного алгоритма """
+        self.count_iterations = 0
+        self.count_useless_iterations = 0
+        self.population = None
+        self.energy_tracker = self.heatmap_tracker = None
+        if algorithm == "charges":
+            self.energy_tracker = EnergyTracker(self.optimized_tree, self.width, self.height)
+        elif algorithm == "bees" and self.fitness == "grey" and self.processes == 1 and HeatmapTracker.is_supported():
+            self.heatmap_tracker = HeatmapTracker(self.optimized_tree, self.optimized_scale_x, self.optimized_scale_y,
+                                                  self.width, self.height, self.destination_heatmap)
+        self.best_ff_value = self.current_ff_value = self.get_ff_value(self.optimized_tree, algorithm)
+        self.best_tree = self.optimized_tree.copy()
+
+    def update_generation(self, algorithm, current_ff_value=None):
+        """
+        Функция, пересчитывающая статистику после получения нового поколения интерфейсов
+        :param current_ff_value: уже вычисленное алгоритмом значение фитнесс-функции optimized_tree
+        """
+        self.count_iterations += 1
+        if current_ff_value is None:
+            current_ff_value = self.get_ff_value(self.optimized_tree, algorithm)
+        self.current_ff_value = current_ff_value
+
+        if self.current_ff_value < self.best_ff_value:
+            self.best_ff_value = self.current_ff_value
+            self.count_useless_iterations = 0
+            self.best_tree = self.optimized_tree.copy()
+        else:
+            self.count_useless_iterations += 1
+
+        if self.on_generation:
+            self.on_generation(self, algorithm)
+
+    def is_running(self):
+        """
+        Функция, проверяющая условия окончания оптимизации:
+        1. Превышено максимальное количество итераций
+        2. Превышено максимальное количество итераций, в течение которых результат не улучшился
+        3. Найден результат с допустимым значением фитнесс-функции
+        """
+        return self.count_iterations < MAX_COUNT_ITERATIONS and \
+            self.count_useless_iterations < MAX_COUNT_USELESS_ITERATIONS and \
+            self.best_ff_value > MAX_FF_DIFFERENCE
+
+    def get_ff_pool(self):
+        """
+        Функция, создающая пул процессов для параллельной оценки вариантов (None, если processes = 1).
+        Пул получает эталонную тепловую карту один раз на всё время работы алгоритма
+        """
+        if self.processes > 1:
+            return FitnessPool(self.destination_heatmap, self.width, self.height, self.processes)
+        return None
+
+    def start_ga(self):
+        """ Функция, запускающая оптимизацию с помощью генетического алгоритма """
+        if self.islands > 1:
+            self.start_island_ga()
+            return
+
+        ga = GA()
+        ff_pool = self.get_ff_pool()
+
+        try:
+            if self.population_size:
+                self.start_population_ga(ga, ff_pool)
+            else:
+                self.start_three_parents_ga(ga, ff_pool)
+        finally:
+            if ff_pool:
+                ff_pool.close()
+
+    def start_three_parents_ga(self, ga, ff_pool=None):
+        """ Функция, выполняющая исходный ГА: 3 родителя => 9 потомков => 3 новых родителя """
+        # Принимаем первым родителем тестируемый интерфейс, вторым - его мутированную версию
+        other_parent = self.optimized_tree.copy()
+        ga.mutation(other_parent, MUTATE_CHANCE)
+
+        # Выполняем скрещивание выбранных родителей и получаем 3 новых варианта
+        three_parents = ga.crossing_over(self.optimized_tree, other_parent)
+
+        # Получаем 3 новых варианта дочерних деревьев из 3-х с помощью ГА, пока выполняются условия продолжения
+        while True:
+            three_parents = ga.evolution(three_parents, self.optimized_scale_x, self.optimized_scale_y,
+                                         self.width, self.height, self.destination_heatmap, self.count_iterations,
+                                         self.ff_cache, ff_pool)
+            self.population = three_parents
+            self.optimized_tree = three_parents[0]
+            self.update_generation("ga")
+            if not self.is_running():
+                break
+
+    def start_population_ga(self, ga, ff_pool=None):
+        """ Функция, выполняющая популяционный ГА с элитизмом и турнирной или ранговой селекцией """
+        population = ga.initial_population(self.optimized_tree, self.population_size)
+        ff_values = ga.estimate_ff_values(population, self.optimized_scale_x, self.optimized_scale_y, self.width,
+                                          self.height, self.destination_heatmap, self.count_iterations,
+                                          self.ff_cache, ff_pool)
+
+        while True:
+            population, ff_values = ga.generation(population, ff_values, self.optimized_scale_x,
+                                                  self.optimized_scale_y, self.width, self.height,
+                                                  self.destination_heatmap, self.count_iterations, self.elitism,
+                                                  self.selection, self.tournament_size, self.ff_cache, ff_pool)
+            # Лучшая особь поколения (её значение фитнесс-функции уже в кэше)
+            self.population = population
+            self.optimized_tree = population[0]
+            self.update_generation("ga")
+            if not self.is_running():
+                break
+
+    def start_island_ga(self):
+        """
+        Функция, выполняющая островной ГА: популяции островов развиваются параллельно в отдельных процессах,
+        обмениваясь лучшими особями каждые migration_interval поколений
+        """
+        with IslandModel(self.optimized_tree, self.optimized_scale_x, self.optimized_scale_y, self.width,
+                         self.height, self.destination_heatmap, self.islands, self.population_size or POPULATION_SIZE,
+                         self.elitism, self.selection, self.tournament_size, self.migration_size) as island_model:
+            while self.is_running():
+                # Лучшая особь всех островов в каждом поколении эпохи (значение фитнесс-функции вычислено островом)
+                for ff_value, coordinates in island_model.epoch(self.migration_interval):
+                    self.optimized_tree = island_model.get_tree(coordinates)
+                    self.update_generation("ga", ff_value)
+                    if not self.is_running():
+                        break
+
+    def start_bees(self):
+        """ Функция, запускающая оптимизацию с помощью алгоритма искусственной пчелиной колонии """
+        bees = Bees()
+        ff_pool = self.get_ff_pool()
+
+        try:
+            # Разведчики ищут новые источники, начиная с исходного тестируемого интерфейса
+            start_tree = self.optimized_tree
+            sources = bees.initial_sources(start_tree, self.food_sources)
+            # Поле интенсивности исходного дерева уже построено при сбросе статистики (reset), остальные источники
+            # получают собственные трекеры - варианты источника отличаются от него перемещением нескольких элементов
+            trackers = None
+            if self.heatmap_tracker:
+                trackers = [self.heatmap_tracker] + [HeatmapTracker(source, self.optimized_scale_x,
+                                                                    self.optimized_scale_y, self.width, self.height,
+                                                                    self.destination_heatmap)
+                                                     for source in sources[1:]]
+            ff_values = bees.estimate_ff_values(sources, self.optimized_scale_x, self.optimized_scale_y, self.width,
+                                                self.height, self.destination_heatmap, self.count_iterations,
+                                                self.ff_cache, ff_pool, trackers)
+            trials = [0] * len(sources)
+
+            while self.is_running():
+                sources, ff_values, trials = bees.cycle(sources, ff_values, trials, start_tree,
+                                                        self.optimized_scale_x, self.optimized_scale_y, self.width,
+                                                        self.height, self.destination_heatmap, self.count_iterations,
+                                                        self.trial_limit, self.ff_cache, ff_pool, trackers)
+                # Лучший источник цикла (его значение фитнесс-функции уже в кэше)
+                self.population = sources
+                self.optimized_tree = sources[ff_values.index(min(ff_values))]
+                self.update_generation("bees")
+        finally:
+            if ff_pool:
+                ff_pool.close()
+
+    def start_charges(self):
+        """ Функция, запускающая оптимизацию с помощью алгоритма поиска системой зарядов """
+        charges = Charges()
+        # Частицы - варианты расположения Layout; структура дерева (порядок узлов, поддеревья) общая для всех частиц
+        start_tree = self.optimized_tree
+        structure = Layout.from_tree(start_tree)
+
+        particles = charges.initial_particles(structure, self.charges_count)
+        # Энергия исходного дерева уже вычислена при сбросе статистики (reset)
+        trackers = [self.energy_tracker] + [EnergyTracker(particle, self.width, self.height)
+                                            for particle in particles[1:]]
+        ff_values = charges.estimate_ff_values_charges(particles, trackers, self.width, self.height,
+                                                       self.initial_energy)
+        memory = charges.update_memory([], particles, ff_values, self.memory_size)
+
+        while self.is_running():
+            particles, ff_values, memory = charges.iteration(particles, ff_values, trackers, memory, self.width,
+                                                             self.height, self.initial_energy, structure,
+                                                             self.memory_size)
+            # Лучшая частица итерации (в виде дерева - для отображения и сохранения)
+            best_index = ff_values.index(min(ff_values))
+            self.population = particles
+            self.optimized_tree = particles[best_index].to_tree(start_tree)
+            self.update_generation("charges", ff_values[best_index])
+
+    def run(self, algorithm):
+        """
+        Запуск выбранного алгоритма оптимизации
+        :param algorithm: название алгоритма - "ga" | "bees" | "charges"
+        :return: лучшее найденное дерево элементов
+        """
+        self.reset(algorithm)
+
+        if algorithm == "ga":
+            self.start_ga()
+        elif algorithm == "bees":
+            self.start_bees()
+        elif algorithm == "charges":
+            self.start_charges()
+        else:
+            raise ValueError("Unknown algorithm: {}".format(algorithm))
+
+        # Оставляем лучший из найденных
+        self.optimized_tree = self.best_tree.copy()
+        return self.best_tree
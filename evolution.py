@@ -1,116 +1,57 @@
+from collections import namedtuple
+
 from PyQt5.QtCore import QThread
-from time import sleep
-import copy
 
-from ga import GA
-from bees import Bees
-from charges import Charges
+from engine import OptimizationEngine
 
-MUTATE_CHANCE = 0.3
-MAX_COUNT_ITERATIONS = 99
-MAX_COUNT_USELESS_ITERATIONS = 49
-MAX_FF_DIFFERENCE = 10
 SAVE_HEATMAP = 0
 
+# Результат очередного поколения, передаваемый из потока оптимизации в графический интерфейс:
+# tree - снимок текущего дерева (Tree.copy), best_tree - лучшее найденное дерево (потоком больше не изменяется)
+GenerationResult = namedtuple('GenerationResult', ['algorithm', 'tree', 'best_tree', 'count_iterations',
+                                                   'count_useless_iterations', 'current_ff_value', 'best_ff_value'])
+
 
 class EvolutionThread(QThread):
     """
-    Класс, реализующий отдельный поток выполнения выбранного алгоритма оптимизации
+    Класс, реализующий отдельный поток выполнения выбранного алгоритма оптимизации: значения фитнесс-функции,
+    лучший результат и условия окончания считаются в этом потоке (OptimizationEngine), а графический интерфейс
+    получает готовый результат каждого поколения и только отображает его
     """
     def __init__(self, garnet_blocks):
         super(EvolutionThread, self).__init__()
         self.garnet_blocks = garnet_blocks
 
-    def start_ga(self):
-        """ Функция, запускающая оптимизацию с помощью генетического алгоритма """
-        ga = GA()
-
-        # Принимаем первым родителем тестируемый интерфейс, вторым - его мутированную версию
-        other_parent = copy.deepcopy(self.garnet_blocks.optimized_tree)
-        ga.mutation(other_parent, MUTATE_CHANCE)
-
-        # Выполняем скрещивание выбранных родителей и получаем 3 новых варианта
-        three_parents = ga.crossing_over(self.garnet_blocks.optimized_tree, other_parent)
-
+        # Состояние виджетов считываем в потоке графического интерфейса, при создании потока оптимизации
+        self.width = garnet_blocks.ui.optimizedView.width()
+        self.height = garnet_blocks.ui.optimizedView.height()
+        if garnet_blocks.ui.gaRadioButton.isChecked():
+            self.algorithm = "ga"
+        elif garnet_blocks.ui.beesRadioButton.isChecked():
+            self.algorithm = "bees"
+        elif garnet_blocks.ui.chargesRadioButton.isChecked():
+            self.algorithm = "charges"
+        else:
+            self.algorithm = None
+
+        # Поток работает с собственной копией дерева (общие узлы копируются при изменении)
+        self.initial_tree = garnet_blocks.initial_tree
+        self.optimized_tree = garnet_blocks.optimized_tree.copy()
+
+        # Эталон, подготовленный при загрузке интерфейсов, и постоянный кэш - на случай, если размер холста изменился
+        self.reference = garnet_blocks.reference
+        self.reference_cache = garnet_blocks.reference_cache
+        self.initial_file_name = garnet_blocks.initial_file_name
+
+    def publish(self, engine, algorithm):
+        """ Функция, передающая графическому интерфейсу результат очередного поколения (OptimizationEngine) """
         # Сохраняем изображения на диск, если требуется
-        heatmap_number = 1
-        if SAVE_HEATMAP:
-            self.save_generation_heatmaps(three_parents, heatmap_number)
-        heatmap_number += 1
-
-        # Получаем 3 новых варианта дочерних деревьев из 3-х с помощью ГА
-        new_parents = ga.evolution(three_parents, self.garnet_blocks.optimized_scale_x,
-                                   self.garnet_blocks.optimized_scale_y, self.garnet_blocks.ui.optimizedView.width(),
-                                   self.garnet_blocks.ui.optimizedView.height(), self.garnet_blocks.destination_heatmap,
-                                   heatmap_number)
-        if SAVE_HEATMAP:
-            self.save_generation_heatmaps(new_parents, heatmap_number)
-        heatmap_number += 1
-        self.garnet_blocks.optimized_tree = new_parents[0]
-        self.garnet_blocks.events.generation_completed.emit("ga")
-
-        # Продолжаем эволюцию, пока не выполнится одно из условий окончиния:
-        # 1. Превышено максимальное количество итераций
-        # 2. Превышено максимальное количество итераций, в течение которых результат не улучшился
-        # 3. Найден результат с допустимым значением фитнесс-функции
-        while self.garnet_blocks.count_iterations < MAX_COUNT_ITERATIONS and \
-                self.garnet_blocks.count_useless_iterations < MAX_COUNT_USELESS_ITERATIONS and \
-                self.garnet_blocks.best_ff_value > MAX_FF_DIFFERENCE:
-            # Получаем 3 новых варианта дочерних деревьев из 3-х с помощью ГА
-            new_parents = ga.evolution(three_parents, self.garnet_blocks.optimized_scale_x,
-                                       self.garnet_blocks.optimized_scale_y,
-                                       self.garnet_blocks.ui.optimizedView.width(),
-                                       self.garnet_blocks.ui.optimizedView.height(),
-                                       self.garnet_blocks.destination_heatmap, heatmap_number)
-            if SAVE_HEATMAP:
-                self.save_generation_heatmaps(new_parents, heatmap_number)
-            heatmap_number += 1
-            self.garnet_blocks.optimized_tree = new_parents[0]
-            self.garnet_blocks.events.generation_completed.emit("ga")
-
-        # Показываем лучший из найденных
-        self.garnet_blocks.optimized_tree = copy.deepcopy(self.garnet_blocks.best_tree)
-        self.garnet_blocks.events.generation_completed.emit("ga")
-
-    def start_bees(self):
-        """ Функция, запускающая оптимизацию с помощью алгоритма пчелиной колонии """
-        bees = Bees()
-
-        # Продолжаем перемещение, пока не выполнится одно из условий окончиния:
-        # 1. Превышено максимальное количество итераций
-        # 2. Превышено максимальное количество итераций, в течение которых результат не улучшился
-        # 3. Найден результат с допустимым значением фитнесс-функции
-        while self.garnet_blocks.count_iterations < MAX_COUNT_ITERATIONS and \
-                self.garnet_blocks.count_useless_iterations < MAX_COUNT_USELESS_ITERATIONS and \
-                self.garnet_blocks.best_ff_value > MAX_FF_DIFFERENCE:
-            # Получаем 3 новых варианта дочерних деревьев из 3-х с помощью алгоритма пчелиной колонии
-            bees.move_bees(self.garnet_blocks.optimized_tree)
-            self.garnet_blocks.events.generation_completed.emit("bees")
-            sleep(1)
+        if SAVE_HEATMAP and algorithm == "ga" and engine.population:
+            self.save_generation_heatmaps(engine.population, engine.count_iterations)
 
-        # Показываем лучший из найденных
-        self.garnet_blocks.optimized_tree = copy.deepcopy(self.garnet_blocks.best_tree)
-        self.garnet_blocks.events.generation_completed.emit("bees")
-
-    def start_charges(self):
-        """ Функция, запускающая оптимизацию с помощью алгоритма поиска системой зарядов """
-        charges = Charges()
-
-        # Продолжаем перемещение, пока не выполнится одно из условий окончиния:
-        # 1. Превышено максимальное количество итераций
-        # 2. Превышено максимальное количество итераций, в течение которых результат не улучшился
-        # 3. Найден результат с допустимым значением фитнесс-функции
-        while self.garnet_blocks.count_iterations < MAX_COUNT_ITERATIONS and \
-                self.garnet_blocks.count_useless_iterations < MAX_COUNT_USELESS_ITERATIONS and \
-                self.garnet_blocks.best_ff_value > MAX_FF_DIFFERENCE:
-            # Получаем 3 новых варианта дочерних деревьев из 3-х с помощью алгоритма системы зарядов
-            charges.move_charges(self.garnet_blocks.optimized_tree)
-            self.garnet_blocks.events.generation_completed.emit("charges")
-            sleep(1)
-
-        # Показываем лучший из найденных
-        self.garnet_blocks.optimized_tree = copy.deepcopy(self.garnet_blocks.best_tree)
-        self.garnet_blocks.events.generation_completed.emit("charges")
+        self.garnet_blocks.events.generation_completed.emit(GenerationResult(
+            algorithm, engine.optimized_tree.copy(), engine.best_tree, engine.count_iterations,
+            engine.count_useless_iterations, engine.current_ff_value, engine.best_ff_value))
 
     def save_generation_heatmaps(self, trees, heatmap_number):
         """
@@ -124,11 +65,22 @@ class EvolutionThread(QThread):
             child_number += 1
 
     def run(self):
-        """ Запуск выбранного алгоритма оптимизации согласно radioButton """
-        # В зависимости от выбранного radio_button, выполняем эволюцию тем или иным алгоритмом
-        if self.garnet_blocks.ui.gaRadioButton.isChecked():
-            self.start_ga()
-        elif self.garnet_blocks.ui.beesRadioButton.isChecked():
-            self.start_bees()
-        elif self.garnet_blocks.ui.chargesRadioButton.isChecked():
-            self.start_charges()
+        """ Запуск выбранного согласно radioButton алгоритма оптимизации """
+        if self.algorithm is None:
+            return
+
+        # Окно могло быть изменено после загрузки интерфейсов - берём эталон для текущего размера холста
+        reference = self.reference
+        if (reference.width, reference.height) != (self.width, self.height):
+            reference = self.reference_cache.get_reference(self.initial_file_name, self.width, self.height,
+                                                           ("heatmap",))
+
+        engine = OptimizationEngine(self.initial_tree, self.optimized_tree, self.width, self.height,
+                                    reference=reference)
+        engine.on_generation = self.publish
+
+        # Продолжаем оптимизацию, пока не выполнится одно из условий окончиния (OptimizationEngine.is_running)
+        engine.run(self.algorithm)
+
+        # Показываем лучший из найденных
+        self.publish(engine, self.algorithm)
@@ -1,39 +1,88 @@
-import math, os
+import hashlib, math
 from functools import partial
-from PIL import ImageChops, Image
-from heatmap import Heatmapper
+import numpy
+from PIL import ImageChops
+from heatmap import LRUCache, NumPyGreyHeatmapper
+from heatmap_renderer import get_renderer
+from layout import Layout
+
+ENERGY_BLOCK_SIZE = 2 ** 20  # максимальное число пар зарядов, обрабатываемых за один раз
 
 
 class FitnessFunctions:
     @staticmethod
-    def estimate_ff_value(tree, scale_x, scale_y, width, height, destination_heatmap, iteration):
-        """ Функция, возвращаящая значение фитнесс-функции по различиям тепловых карт двух интерфейсов """
-        # Внутренняя функция для получения точек интенсивности тепла не тепловой карте
-        def get_points(child_tree, tree_root, heat_points, depth=0):
-            max_depth = child_tree.get_max_depth()
-            actual_depth = depth + (6 - max_depth)  # 6 - максимальное значение глубины для карты с 7 цветами
-            # Добавляем точку в список вершин для построения тепловой карты
-            if len(tree_root.children) == 0 and actual_depth >= 0:
-                heat_points.append((int(tree_root.left / scale_x), int(tree_root.top / scale_y),
-                                    int(tree_root.width / scale_x), int(tree_root.height / scale_y),
-                                    actual_depth/6))
-            for child in tree_root.children:
-                get_points(child_tree, child, heat_points, depth+1)
-            pass
-
-        # Вызываем внутреннюю функция и получаем точки
-        points = []
-        get_points(tree, tree.root, points)
+    def estimate_ff_value(tree, scale_x, scale_y, width, height, destination_heatmap, iteration,
+                          heatmap_tracker=None, ff_cache=None):
+        """
+        Функция, возвращаящая значение фитнесс-функции по различиям тепловых карт двух интерфейсов
+        :param destination_heatmap: PIL изображение эталонной тепловой карты или её поле интенсивности
+                                    (numpy массив из get_grey_field) - тогда сравнение идёт без раскраски
+        :param heatmap_tracker: HeatmapTracker дерева tree - перерисовываются только области перемещённых элементов
+        :param ff_cache: FitnessCache - для уже оценённого расположения элементов тепловая карта не строится
+        """
+        if ff_cache is not None:
+            key = ff_cache.get_key(tree, destination_heatmap, scale_x, scale_y, width, height)
+            return ff_cache.get(key, partial(FitnessFunctions.estimate_ff_value, tree, scale_x, scale_y, width,
+                                             height, destination_heatmap, iteration, heatmap_tracker))
+
+        if heatmap_tracker:
+            return heatmap_tracker.update(tree)
+
+        points = FitnessFunctions.get_points(tree, scale_x, scale_y)
 
-        # Формируем тепловую карту для дерева элементов
-        _asset_file = partial(os.path.join, os.path.dirname(__file__), 'assets')
-        image = Image.open(_asset_file('base.png'))
-        image = image.resize((width, height))
-        heatmap = Heatmapper(colours='default')
-        heatmap = heatmap.heatmap_on_img(points, image)
+        return FitnessFunctions.estimate_points_ff_value(points, width, height, destination_heatmap)
+
+    @staticmethod
+    def estimate_points_ff_value(points, width, height, destination_heatmap):
+        """
+        Функция, возвращаящая значение фитнесс-функции по точкам тепловой карты (get_points) интерфейса
+        :param destination_heatmap: PIL изображение эталонной тепловой карты или её поле интенсивности
+        """
+        if isinstance(destination_heatmap, numpy.ndarray):
+            grey_field = get_renderer().grey_field(points, width, height)
+            return FitnessFunctions.get_ff_value_grey(destination_heatmap, grey_field)
+
+        heatmap = get_renderer().heatmap(points, width, height)
 
         return FitnessFunctions.get_ff_value(destination_heatmap, heatmap)
 
+    @staticmethod
+    def get_points(tree, scale_x, scale_y):
+        """
+        Функция, возвращающая точки интенсивности тепла на тепловой карте
+        :param tree: дерево элементов типа Tree или вариант расположения элементов типа Layout
+        :return: список кортежей вида (x, y, width, height, intensity)
+        """
+        if isinstance(tree, Layout):
+            return tree.get_points(scale_x, scale_y)
+
+        # Один проход по листьям: глубина узлов и максимальная глубина дерева вычислены заранее
+        max_depth = tree.get_max_depth()
+        points = []
+        for leaf in tree.get_leaves():
+            actual_depth = leaf.depth + (6 - max_depth)  # 6 - максимальное значение глубины для карты с 7 цветами
+            # Добавляем точку в список вершин для построения тепловой карты
+            if actual_depth >= 0:
+                points.append((int(leaf.left / scale_x), int(leaf.top / scale_y),
+                               int(leaf.width / scale_x), int(leaf.height / scale_y), actual_depth/6))
+
+        return points
+
+    @staticmethod
+    def get_heatmap(tree, scale_x, scale_y, width, height):
+        """ Функция, формирующая PIL изображение тепловой карты дерева элементов размером width x height """
+        points = FitnessFunctions.get_points(tree, scale_x, scale_y)
+
+        # Формируем тепловую карту для дерева элементов общим рендерером (ресурсы загружены один раз)
+        return get_renderer().heatmap(points, width, height)
+
+    @staticmethod
+    def get_grey_field(tree, scale_x, scale_y, width, height):
+        """ Функция, формирующая поле интенсивности тепла дерева элементов (numpy массив height x width) """
+        points = FitnessFunctions.get_points(tree, scale_x, scale_y)
+
+        return get_renderer().grey_field(points, width, height)
+
     @staticmethod
     def get_ff_value(destination_heatmap, current_heatmap):
         """ Функция, вычисляющая значение фитнесс-функции по различиям тепловых карт двух интерфейсов """
@@ -46,45 +95,334 @@ class FitnessFunctions:
         return rms
 
     @staticmethod
-    def get_energy(tree, width, height):
-        """ Функция, вычисляющая энергию взаимодействия системы зарядов """
-        charges = []
+    def get_ff_value_grey(destination_field, current_field):
+        """
+        Функция, вычисляющая значение фитнесс-функции по различиям полей интенсивности тепла двух интерфейсов
+        (среднеквадратичное отклонение в оттенках серого, без раскраски и наложения на фон)
+        """
+        diff = (destination_field - current_field).ravel()
+        return math.sqrt(numpy.dot(diff, diff) / float(diff.size))
 
-        # Внутернняя функция, добваляющая элементы дерева в массив заярдов
-        def add_charges(root_charge, depth=0):
-            charges.append((root_charge.left, root_charge.top, root_charge.width, root_charge.height, depth))
-            for charge in root_charge.children:
-                add_charges(charge, depth+1)
+    @staticmethod
+    def get_charges(tree):
+        """
+        Функция, формирующая массив зарядов системы по элементам дерева (в порядке обхода в глубину)
+        :param tree: дерево элементов типа Tree или вариант расположения элементов типа Layout
+        :return: numpy массив размером (n, 5) со строками вида (left, top, width, height, depth)
+        """
+        if isinstance(tree, Layout):
+            return tree.get_charges()
 
-        # Вызываем внутреннюю функцию и заполняем массив значениеми
-        add_charges(tree.root)
-        energy = 0
+        charges = [(element.left, element.top, element.width, element.height, element.depth)
+                   for element in tree.get_nodes()]
 
-        for i in range(0, len(charges)):
-            for j in range(i+1, len(charges)):
-                charge1 = charges[i]
-                charge2 = charges[j]
+        return numpy.array(charges, dtype=numpy.float64).reshape(-1, 5)
 
-                # Расчёт значения заряда по размерам (длине и ширине) элемента и глубины в DOM дереве:
-                # q = element.width * element.height * element.depth / (view.width * view.height) * 10
-                q1 = int(charge1[2] * charge1[3] * charge1[4] * 100 / (width * height) * 20)
-                q2 = int(charge2[2] * charge2[3] * charge2[4] * 100 / (width * height) * 20)
+    @staticmethod
+    def get_charge_values(charges, width, height):
+        """
+        Функция, вычисляющая значения зарядов по размерам (длине и ширине) элемента и глубины в DOM дереве:
+        q = int(element.width * element.height * element.depth * 100 / (view.width * view.height) * 20)
+        """
+        return numpy.trunc(charges[:, 2] * charges[:, 3] * charges[:, 4] * 100 / (width * height) * 20)
 
-                # Расчёт расстояния между центрами элементов интерфейса
-                r = int(math.sqrt(math.pow((charge1[0] + charge1[2] / 2 - charge2[0] - charge2[2] / 2), 2) +
-                                  math.pow((charge1[1] + charge1[3] / 2 - charge2[1] - charge2[3] / 2), 2)))
+    @staticmethod
+    def get_pairs_energy(charges1, q1, charges2, q2, upper_triangle=False):
+        """
+        Функция, вычисляющая суммарный потенциал всех пар зарядов из charges1 и charges2 блоками не более
+        ENERGY_BLOCK_SIZE пар, чтобы расход памяти не зависел от размера дерева
+        :param q1: значения зарядов charges1 (get_charge_values)
+        :param q2: значения зарядов charges2
+        :param upper_triangle: charges1 и charges2 - один и тот же массив, учитываются только пары i < j
+        """
+        # Центр элемента по оси x: left + width / 2 (порядок операций тот же, что в исходной формуле)
+        centers_x1 = charges1[:, 0] + charges1[:, 2] / 2
+        centers_y1 = charges1[:, 1] + charges1[:, 3] / 2
+        left2, half_width2 = charges2[:, 0], charges2[:, 2] / 2
+        top2, half_height2 = charges2[:, 1], charges2[:, 3] / 2
 
-                # Если расстояние между центрами не ноль, то прибавляем потенциал
-                if r:
-                    energy += q1 * q2 / r
+        energy = 0.0
+        rows = max(1, ENERGY_BLOCK_SIZE // max(1, len(charges2)))
+        for start in range(0, len(charges1), rows):
+            stop = min(start + rows, len(charges1))
+            # Для треугольного режима столбцы левее start не нужны: в них только пары j <= i
+            first = start if upper_triangle else 0
+
+            # Расчёт расстояния между центрами элементов интерфейса
+            dx = centers_x1[start:stop, numpy.newaxis] - left2[numpy.newaxis, first:] - half_width2[first:]
+            dy = centers_y1[start:stop, numpy.newaxis] - top2[numpy.newaxis, first:] - half_height2[first:]
+            r = numpy.trunc(numpy.sqrt(dx * dx + dy * dy))
+
+            # Если расстояние между центрами не ноль, то прибавляем потенциал
+            mask = r != 0
+            if upper_triangle:
+                mask &= numpy.arange(first, len(charges2)) > numpy.arange(start, stop)[:, numpy.newaxis]
+            potentials = q1[start:stop, numpy.newaxis] * q2[numpy.newaxis, first:]
+            energy += float(numpy.sum(potentials[mask] / r[mask]))
 
         return energy
 
     @staticmethod
-    def get_ff_value_charges(optimized_tree, width, height, initial_energy):
+    def get_forces(charges, q):
+        """
+        Функция, вычисляющая равнодействующие силы, действующие на заряды, по той же модели, что и get_energy
+        (потенциал пары q1 * q2 / r, r - расстояние между центрами элементов): F_i = -dE/dx_i, блоками не более
+        ENERGY_BLOCK_SIZE пар
+        :param q: значения зарядов charges (get_charge_values)
+        :return: numpy массив размером (n, 2) с проекциями силы на оси x и y (положительные - от других зарядов)
+        """
+        centers_x = charges[:, 0] + charges[:, 2] / 2
+        centers_y = charges[:, 1] + charges[:, 3] / 2
+
+        forces = numpy.zeros((len(charges), 2))
+        rows = max(1, ENERGY_BLOCK_SIZE // max(1, len(charges)))
+        for start in range(0, len(charges), rows):
+            stop = min(start + rows, len(charges))
+            dx = centers_x[start:stop, numpy.newaxis] - centers_x[numpy.newaxis, :]
+            dy = centers_y[start:stop, numpy.newaxis] - centers_y[numpy.newaxis, :]
+            r = numpy.trunc(numpy.sqrt(dx * dx + dy * dy))
+
+            # Пары с нулевым расстоянием между центрами (в том числе заряд сам с собой) не учитываются
+            magnitudes = numpy.zeros_like(r)
+            mask = r != 0
+            magnitudes[mask] = (q[start:stop, numpy.newaxis] * q[numpy.newaxis, :])[mask] / r[mask] ** 3
+            forces[start:stop, 0] = numpy.sum(magnitudes * dx, axis=1)
+            forces[start:stop, 1] = numpy.sum(magnitudes * dy, axis=1)
+
+        return forces
+
+    @staticmethod
+    def get_energy(tree, width, height):
+        """ Функция, вычисляющая энергию взаимодействия системы зарядов """
+        charges = FitnessFunctions.get_charges(tree)
+        q = FitnessFunctions.get_charge_values(charges, width, height)
+
+        # Заряды с нулевым значением не вносят вклад в энергию (в том числе корень дерева с глубиной 0)
+        charged = q != 0
+        charges, q = charges[charged], q[charged]
+
+        return FitnessFunctions.get_pairs_energy(charges, q, charges, q, upper_triangle=True)
+
+    @staticmethod
+    def get_ff_value_charges(optimized_tree, width, height, initial_energy, energy_tracker=None):
         """
         Функция, вычисляющая значение фитнесс-функции по различиям тепловых карт двух интерфейсов для алгоритма зарядов
+        :param energy_tracker: EnergyTracker дерева optimized_tree - энергия пересчитывается только для перемещённых
+                               элементов, иначе - полностью
         :return: значение фитнесс функции для алгоритма поиска системой зарядов
         """
-        return math.fabs(FitnessFunctions.get_energy(optimized_tree, width, height) - initial_energy)
+        if energy_tracker:
+            energy = energy_tracker.update(optimized_tree)
+        else:
+            energy = FitnessFunctions.get_energy(optimized_tree, width, height)
+        return math.fabs(energy - initial_energy)
+
+
+class EnergyTracker:
+    """
+    Класс, хранящий энергию системы зарядов дерева элементов и пересчитывающий её после перемещения элементов
+    только для перемещённых зарядов: O(k*n) вместо O(n^2). Структура дерева (а значит, и значения зарядов)
+    при перемещениях не меняется, меняются лишь координаты
+    """
+    def __init__(self, tree, width, height):
+        self.width = width
+        self.height = height
+
+        # Заряды с нулевым значением не вносят вклад в энергию - храним только остальные
+        charges = FitnessFunctions.get_charges(tree)
+        q = FitnessFunctions.get_charge_values(charges, width, height)
+        self.charged = q != 0
+        self.charges = charges[self.charged]
+        self.q = q[self.charged]
+
+        self.energy = FitnessFunctions.get_pairs_energy(self.charges, self.q, self.charges, self.q,
+                                                        upper_triangle=True)
+
+    def update(self, tree):
+        """
+        Функция, пересчитывающая энергию после перемещения элементов дерева tree (того же, что передано в конструктор)
+        :return: текущая энергия системы зарядов
+        """
+        charges = FitnessFunctions.get_charges(tree)[self.charged]
+        moved = numpy.nonzero(numpy.any(charges[:, :2] != self.charges[:, :2], axis=1))[0]
+        if not len(moved):
+            return self.energy
+
+        # Если перемещена большая часть зарядов, полный пересчёт дешевле
+        if 2 * len(moved) > len(charges):
+            return self.recompute(tree)
+
+        static = numpy.ones(len(charges), dtype=bool)
+        static[moved] = False
+        q_moved, q_static = self.q[moved], self.q[static]
+
+        # Вычитаем потенциалы пар с участием перемещённых зарядов в старых положениях и прибавляем в новых
+        for sign, positions in ((-1, self.charges), (1, charges)):
+            self.energy += sign * FitnessFunctions.get_pairs_energy(positions[moved], q_moved,
+                                                                    positions[static], q_static)
+            self.energy += sign * FitnessFunctions.get_pairs_energy(positions[moved], q_moved,
+                                                                    positions[moved], q_moved, upper_triangle=True)
+        self.charges = charges
+
+        return self.energy
+
+    def recompute(self, tree):
+        """
+        Функция, полностью пересчитывающая энергию системы зарядов (точный расчёт для проверки накопленного значения)
+        :return: текущая энергия системы зарядов
+        """
+        self.charges = FitnessFunctions.get_charges(tree)[self.charged]
+        self.energy = FitnessFunctions.get_pairs_energy(self.charges, self.q, self.charges, self.q,
+                                                        upper_triangle=True)
+        return self.energy
+
+
+class HeatmapTracker:
+    """
+    Класс, хранящий поле интенсивности тепла дерева элементов и суммы квадратов отклонений от эталонного поля
+    по квадратным областям холста. После перемещения элементов перерисовываются и пересчитываются только области,
+    занятые перемещёнными листьями до и после перемещения. Сравнение идёт в оттенках серого (get_ff_value_grey),
+    поле строится NumPyGreyHeatmapper: в логарифмической форме вклады точек складываются, поэтому старое положение
+    точки можно вычесть, а новое - прибавить
+    """
+    TILE_SIZE = 32
+    # Допустимое относительное расхождение с полным расчётом (погрешность суммирования по областям)
+    TOLERANCE = 1e-9
+
+    def __init__(self, tree, scale_x, scale_y, width, height, destination_field):
+        """
+        :param destination_field: поле интенсивности эталонного интерфейса (get_grey_field), построенное
+                                  общим рендерером - он должен использовать NumPyGreyHeatmapper (is_supported)
+        """
+        # Эталонное поле другой реализации отличается от поля NumPyGreyHeatmapper даже для того же дерева
+        if not self.is_supported():
+            raise ValueError("HeatmapTracker requires the NumPy grey heatmapper of the shared renderer")
+        self.scale_x = scale_x
+        self.scale_y = scale_y
+        self.width = width
+        self.height = height
+        self.destination_field = destination_field
+        self.grey_heatmapper = get_renderer().heatmapper.grey_heatmapper
+
+        self.points = None
+        self.log_heat = None
+        self.tiles = None
+        self.check(tree)
+
+    @staticmethod
+    def is_supported():
+        """ Функция, проверяющая, что общий рендерер строит поля интенсивности NumPyGreyHeatmapper """
+        return isinstance(get_renderer().heatmapper.grey_heatmapper, NumPyGreyHeatmapper)
+
+    def check(self, tree):
+        """
+        Функция, полностью перерисовывающая поле интенсивности дерева tree и сверяющая значение фитнесс-функции
+        с полным расчётом estimate_ff_value
+        :return: текущее значение фитнесс-функции
+        """
+        ff_value = self.recompute(tree)
+        expected = FitnessFunctions.estimate_points_ff_value(self.points, self.width, self.height,
+                                                             self.destination_field)
+        if not math.isclose(ff_value, expected, rel_tol=self.TOLERANCE, abs_tol=self.TOLERANCE):
+            raise ValueError("HeatmapTracker FF value {} does not match the full evaluation {}".format(ff_value,
+                                                                                                     expected))
+        return ff_value
+
+    def update(self, tree):
+        """
+        Функция, пересчитывающая значение фитнесс-функции после перемещения элементов дерева tree
+        :return: текущее значение фитнесс-функции (среднеквадратичное отклонение полей интенсивности)
+        """
+        points = self.get_points(tree)
+        changed = numpy.nonzero(numpy.any(points != self.points, axis=1))[0]
+        if not len(changed):
+            return self.get_ff_value()
+
+        # Если перемещена большая часть элементов, полная перерисовка дешевле
+        if 2 * len(changed) > len(points):
+            return self.recompute(tree)
+
+        # Вычитаем вклад точек в старых положениях и прибавляем в новых
+        boxes = []
+        for sign, changed_points in ((-1, self.points[changed]), (1, points[changed])):
+            for box, sprite in self.grey_heatmapper.placements(self.width, self.height, changed_points):
+                top, bottom, left, right, sprite_top, sprite_left = box
+                self.log_heat[top:bottom, left:right] += sign * sprite[sprite_top:sprite_top + bottom - top,
+                                                                       sprite_left:sprite_left + right - left]
+                boxes.append((top, bottom, left, right))
+        self.points = points
+
+        for top, bottom, left, right in boxes:
+            self.update_tiles(top, bottom, left, right)
+
+        return self.get_ff_value()
+
+    def recompute(self, tree):
+        """
+        Функция, полностью перерисовывающая поле интенсивности дерева tree
+        :return: текущее значение фитнесс-функции
+        """
+        self.points = self.get_points(tree)
+        self.log_heat = self.grey_heatmapper.log_heat(self.width, self.height, self.points)
+        self.tiles = numpy.zeros((-(-self.height // self.TILE_SIZE), -(-self.width // self.TILE_SIZE)))
+        self.update_tiles(0, self.height, 0, self.width)
+
+        return self.get_ff_value()
+
+    def get_points(self, tree):
+        """ Функция, возвращающая точки тепловой карты дерева в виде numpy массива размером (n, 5) """
+        points = FitnessFunctions.get_points(tree, self.scale_x, self.scale_y)
+        return numpy.array(points, dtype=numpy.float64).reshape(-1, 5)
+
+    def update_tiles(self, top, bottom, left, right):
+        """ Функция, пересчитывающая суммы квадратов отклонений всех областей, пересекающих прямоугольник """
+        size = self.TILE_SIZE
+        top, left = top // size * size, left // size * size
+        bottom, right = min(-(-bottom // size) * size, self.height), min(-(-right // size) * size, self.width)
+
+        with numpy.errstate(under='ignore'):
+            field = 255 * numpy.exp(self.log_heat[top:bottom, left:right])
+        diff = self.destination_field[top:bottom, left:right] - field
+        squares = numpy.add.reduceat(diff * diff, numpy.arange(0, bottom - top, size), axis=0)
+        squares = numpy.add.reduceat(squares, numpy.arange(0, right - left, size), axis=1)
+        self.tiles[top // size:-(-bottom // size), left // size:-(-right // size)] = squares
+
+    def get_ff_value(self):
+        """ Функция, возвращающая среднеквадратичное отклонение поля интенсивности от эталонного """
+        return math.sqrt(float(self.tiles.sum()) / float(self.width * self.height))
+
+
+class FitnessCache(LRUCache):
+    """
+    Класс, хранящий значения фитнесс-функции уже оценённых вариантов расположения элементов (ограниченный LRU кэш).
+    Ключ - хэш вектора (identifier, left, top) всех узлов дерева вместе с эталонной тепловой картой и размерами холста,
+    поэтому повторяющиеся в ГА потомки не отрисовываются заново
+    """
+    def __init__(self, maxsize=4096):
+        super().__init__(maxsize)
+        # Ссылки на эталонные тепловые карты, чтобы их id в ключах не могли достаться другим объектам
+        self._destinations = {}
+
+    @staticmethod
+    def get_layout_key(tree):
+        """ Функция, возвращающая хэш расположения элементов дерева - вектора (identifier, left, top) всех узлов """
+        if isinstance(tree, Layout):
+            return tree.get_layout_key()
+
+        layout = numpy.array([(element.identifier, element.left, element.top) for element in tree.get_nodes()],
+                             dtype=numpy.float64)
+        return hashlib.blake2b(layout.tobytes(), digest_size=16).digest()
+
+    def get_key(self, tree, destination_heatmap, scale_x, scale_y, width, height):
+        """ Функция, возвращающая ключ кэша для дерева tree, оцениваемого по эталону destination_heatmap """
+        self._destinations[id(destination_heatmap)] = destination_heatmap
+        return id(destination_heatmap), scale_x, scale_y, width, height, self.get_layout_key(tree)
+
+    def hit_rate(self):
+        """ Функция, возвращающая долю значений, найденных в кэше """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
 
+    def clear(self):
+        super().clear()
+        self._destinations.clear()
@@ -0,0 +1,87 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from heatmap import NumPyGreyHeatmapper
+from heatmap_renderer import HeatmapRenderer, get_renderer, set_renderer
+from fitness_functions import FitnessFunctions
+
+# Эталонная тепловая карта и размеры холста процесса-исполнителя (задаются один раз при его запуске)
+_destination_heatmap = None
+_width = None
+_height = None
+
+
+def _init_worker(destination_heatmap, width, height, grey_heatmapper):
+    """ Функция, запоминающая параметры оценки в процессе-исполнителе """
+    global _destination_heatmap, _width, _height
+    _destination_heatmap = destination_heatmap
+    _width = width
+    _height = height
+    set_renderer(HeatmapRenderer(grey_heatmapper=grey_heatmapper))
+
+
+def _estimate_ff_value(points):
+    """ Функция, вычисляющая в процессе-исполнителе значение фитнесс-функции по точкам тепловой карты """
+    return FitnessFunctions.estimate_points_ff_value(points, _width, _height, _destination_heatmap)
+
+
+class FitnessPool:
+    """
+    Класс, вычисляющий значения фитнесс-функции нескольких деревьев параллельно в пуле процессов.
+    Эталонная тепловая карта передаётся каждому процессу один раз при запуске, а для каждого дерева - только
+    список точек тепловой карты (x, y, width, height, intensity), а не граф объектов Node
+    """
+    def __init__(self, destination_heatmap, width, height, processes=None):
+        """
+        :param destination_heatmap: эталонная тепловая карта (PIL изображение или поле интенсивности)
+        :param processes: количество процессов (по умолчанию - количество ядер процессора)
+        """
+        self.destination_heatmap = destination_heatmap
+        self.width = width
+        self.height = height
+
+        # Процессы строят тепловые карты той же реализацией GreyHeatMapper, что и основной процесс
+        numpy_heatmapper = isinstance(get_renderer().heatmapper.grey_heatmapper, NumPyGreyHeatmapper)
+        self.executor = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                            initargs=(destination_heatmap, width, height,
+                                                      'NumPy' if numpy_heatmapper else 'PIL'))
+
+    def estimate_ff_values(self, trees, scale_x, scale_y, ff_cache=None):
+        """
+        Функция, вычисляющая значения фитнесс-функции деревьев trees
+        :param ff_cache: FitnessCache - уже оценённые варианты расположения элементов в процессы не передаются
+        :return: список значений фитнесс-функции в порядке trees
+        """
+        ff_values = [None] * len(trees)
+
+        # Одинаковые варианты расположения оцениваются один раз
+        pending = {}
+        for index, tree in enumerate(trees):
+            key = index
+            if ff_cache is not None:
+                key = ff_cache.get_key(tree, self.destination_heatmap, scale_x, scale_y, self.width, self.height)
+                ff_values[index] = ff_cache.get(key)
+                if ff_values[index] is not None:
+                    continue
+            if key not in pending:
+                pending[key] = (FitnessFunctions.get_points(tree, scale_x, scale_y), [])
+            pending[key][1].append(index)
+
+        keys = list(pending)
+        results = self.executor.map(_estimate_ff_value, [pending[key][0] for key in keys])
+        for key, ff_value in zip(keys, results):
+            if ff_cache is not None:
+                ff_cache.put(key, ff_value)
+            for index in pending[key][1]:
+                ff_values[index] = ff_value
+
+        return ff_values
+
+    def close(self):
+        """ Функция, завершающая процессы пула """
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
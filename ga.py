@@ -1,17 +1,26 @@
-import random, copy
+import random
 from population_algorithms import PopulationAlgorithms
-from fitness_functions import FitnessFunctions
 
 MUTATE_CHANCE = 0.3
 PRINT_INFO = 0
 
+# Параметры популяционного ГА (GA.generation)
+POPULATION_SIZE = 30
+ELITISM_COUNT = 2
+SELECTION = "tournament"
+SELECTION_METHODS = ("tournament", "rank")
+TOURNAMENT_SIZE = 3
+
 
 class GA(PopulationAlgorithms):
     """
     Класс, реализующий генетический алгоритм с основными операторами: скрещиванием и мутациями
     """
     def mutation(self, tree, chance):
-        """ Функция, выпролняющая мутацию (случайное изменение положения элементов дерева) """
+        """
+        Функция, выпролняющая мутацию (случайное изменение положения элементов дерева)
+        Изменяемые узлы копируются, поэтому копии дерева tree (Tree.copy) не затрагиваются
+        """
         def check_children(element):
             if len(element.children) > 1:
                 if chance > random.random():
@@ -22,7 +31,7 @@ class GA(PopulationAlgorithms):
                         index2 = random.randint(0, len(element.children)-1)
                     # Меняем местрами элементы с установленными номерами, если это не пункты меню li
                     if not (element.children[index1].tag_name == "li" and element.children[index2].tag_name == "li"):
-                        self.change_elements(element, index1, index2)
+                        element = self.change_elements(element, index1, index2, tree)
 
             for child in element.children:
                 check_children(child)
@@ -31,38 +40,51 @@ class GA(PopulationAlgorithms):
         check_children(tree.root)
 
     def crossing_over(self, tree1, tree2):
-        """ Функция, выполняющая кроссинговер (обмен свойств расположения элеметов между двумя деревьями) """
-        def modify_child(result_element, element2):
+        """
+        Функция, выполняющая кроссинговер (обмен свойств расположения элеметов между двумя деревьями)
+        Потомки - копии tree1 с копированием при записи: узлы, положение которых не изменилось, остаются общими
+        с родителем, а сами родители не изменяются
+        """
+        def modify_child(result_tree, result_element, tree2_copy, element2):
             # С шансом 50% берём свойства (позиционирование всех дочерних элементов для result_element) от element2
-            if random.random() > 0.5:
-                for result_child in result_element.children:
-                    for child2 in element2.children:
-                        if result_child.identifier == child2.identifier:
-                            self.change_child_x(result_child, child2.left-result_child.left)
-                            self.change_child_y(result_child, child2.top-result_child.top)
-            # Если не берём свойства от element2 - то изменяем позиционирование его дочерних элементов
-            else:
-                for result_child in result_element.children:
-                    for child2 in element2.children:
-                        if result_child.identifier == child2.identifier:
-                            self.change_child_x(child2, result_child.left-child2.left)
-                            self.change_child_y(child2, result_child.top-child2.top)
+            take_from_element2 = random.random() > 0.5
 
             for result_child in result_element.children:
-                for child2 in element2.children:
-                    if result_child.identifier == child2.identifier:
-                        # Рекурсивно вызываем функцию
-                        modify_child(result_child, child2)
+                # Соответствующий узел второго дерева находим по положению узла с тем же идентификатором в tree2,
+                # а не перебором дочерних узлов (копия tree2 имеет ту же структуру)
+                position = tree2.get_position(result_child)
+                if position is None or position >= len(element2.children) or \
+                        element2.children[position].identifier != result_child.identifier:
+                    continue
+                child2 = element2.children[position]
+
+                if take_from_element2:
+                    result_child = self.change_child_x(result_child, child2.left-result_child.left, result_tree)
+                    result_child = self.change_child_y(result_child, child2.top-result_child.top, result_tree)
+                # Если не берём свойства от element2 - то изменяем позиционирование его дочерних элементов
+                else:
+                    child2 = self.change_child_x(child2, result_child.left-child2.left, tree2_copy)
+                    child2 = self.change_child_y(child2, result_child.top-child2.top, tree2_copy)
+
+                # Рекурсивно вызываем функцию (поддеревья дочерних узлов не пересекаются, поэтому порядок обработки
+                # совпадает с поочерёдным перемещением всех дочерних узлов и последующей рекурсией)
+                modify_child(result_tree, result_child, tree2_copy, child2)
 
         # Создаём 3 дерева, которые будут потомками от двух деревьев-родителей tree1 и tree2 и формируем их структуру
-        child_trees = [copy.deepcopy(tree1), copy.deepcopy(tree1), copy.deepcopy(tree1)]
+        child_trees = [tree1.copy(), tree1.copy(), tree1.copy()]
         for result_tree in child_trees:
-            modify_child(result_tree.root, copy.deepcopy(tree2.root))
+            tree2_copy = tree2.copy()
+            modify_child(result_tree, result_tree.root, tree2_copy, tree2_copy.root)
 
         return child_trees
 
-    def evolution(self, three_parents, scale_x, scale_y, width, height, destination_heatmap, iteration):
-        """ Основной процесс рабоыт генетического алгоритма """
+    def evolution(self, three_parents, scale_x, scale_y, width, height, destination_heatmap, iteration,
+                  ff_cache=None, ff_pool=None):
+        """
+        Основной процесс рабоыт генетического алгоритма
+        :param ff_cache: FitnessCache - потомки с уже оценённым расположением элементов не отрисовываются заново
+        :param ff_pool: FitnessPool - потомки оцениваются параллельно в пуле процессов
+        """
         # =========================================================================================================
         # 1. Запускаем скрещивание с возможными вариантами родителей (3 родителя => 3 комбинации => 9 вариантов)
         # =========================================================================================================
@@ -82,15 +104,11 @@ class GA(PopulationAlgorithms):
         # =========================================================================================================
         # 3. Оцениваем приспособленность всех особей с помощью тепловой карты
         # =========================================================================================================
-        number = 1
-        child_trees_ff_values = []
-        for child_tree in child_trees:
-            ff_value = FitnessFunctions.estimate_ff_value(child_tree, scale_x, scale_y, width, height,
-                                                          destination_heatmap, iteration)
-            child_trees_ff_values.append(ff_value)
-            if PRINT_INFO:
+        child_trees_ff_values = self.estimate_ff_values(child_trees, scale_x, scale_y, width, height,
+                                                        destination_heatmap, iteration, ff_cache, ff_pool)
+        if PRINT_INFO:
+            for number, ff_value in enumerate(child_trees_ff_values, 1):
                 print("Child {} FF value:".format(number), ff_value)
-            number += 1
 
         # =========================================================================================================
         # 4. Производим селекцию, оставляя лишь 3 из 9 особей (2 с лучшим показателем FF и 1 случайную)
@@ -120,10 +138,63 @@ class GA(PopulationAlgorithms):
         # =========================================================================================================
         return new_parents
 
+    def initial_population(self, tree, population_size=POPULATION_SIZE):
+        """
+        Функция, формирующая начальную популяцию: исходное дерево и его мутированные копии (с общими узлами)
+        :return: список деревьев размером population_size
+        """
+        population = [tree]
+        while len(population) < population_size:
+            other_tree = tree.copy()
+            self.mutation(other_tree, MUTATE_CHANCE)
+            population.append(other_tree)
+        return population
+
+    def select(self, population, ff_values, selection=SELECTION, tournament_size=TOURNAMENT_SIZE):
+        """
+        Функция, выбирающая одного родителя из популяции (меньшее значение фитнесс-функции - лучше)
+        :param selection: "tournament" - лучший из tournament_size случайных особей,
+                          "rank" - случайная особь с вероятностью, пропорциональной рангу (лучшая - N, худшая - 1)
+        """
+        if selection == "tournament":
+            indexes = random.sample(range(len(population)), min(tournament_size, len(population)))
+            return population[min(indexes, key=lambda index: ff_values[index])]
+        if selection == "rank":
+            order = sorted(range(len(population)), key=lambda index: ff_values[index])
+            weights = range(len(order), 0, -1)
+            return population[random.choices(order, weights=weights)[0]]
+        raise ValueError("Unknown selection method: {}".format(selection))
+
+    def generation(self, population, ff_values, scale_x, scale_y, width, height, destination_heatmap, iteration,
+                   elitism=ELITISM_COUNT, selection=SELECTION, tournament_size=TOURNAMENT_SIZE,
+                   ff_cache=None, ff_pool=None):
+        """
+        Функция, формирующая следующее поколение популяционного ГА того же размера, что и population
+        :param ff_values: значения фитнесс-функции особей population
+        :param elitism: количество лучших особей, переходящих в следующее поколение без изменений
+        :return: новое поколение и значения фитнесс-функции его особей, отсортированные от лучшей к худшей
+        """
+        # 1. Лучшие особи переходят в следующее поколение без изменений (родители скрещиванием не изменяются)
+        order = sorted(range(len(population)), key=lambda index: ff_values[index])
+        elite = [population[index] for index in order[:elitism]]
+        elite_ff_values = [ff_values[index] for index in order[:elitism]]
+
+        # 2. Остальные места занимают потомки выбранных родителей, подверженные случайным мутациям
+        children = []
+        while len(elite) + len(children) < len(population):
+            first_parent = self.select(population, ff_values, selection, tournament_size)
+            second_parent = self.select(population, ff_values, selection, tournament_size)
+            children.extend(self.crossing_over(first_parent, second_parent))
+        children = children[:len(population) - len(elite)]
+        for child in children:
+            if random.random() < MUTATE_CHANCE:
+                self.mutation(child, MUTATE_CHANCE)
 
+        # 3. Все потомки поколения оцениваются одним пакетом
+        children_ff_values = self.estimate_ff_values(children, scale_x, scale_y, width, height, destination_heatmap,
+                                                     iteration, ff_cache, ff_pool)
 
-
-
-
-
-
+        new_population = elite + children
+        new_ff_values = elite_ff_values + children_ff_values
+        order = sorted(range(len(new_population)), key=lambda index: new_ff_values[index])
+        return [new_population[index] for index in order], [new_ff_values[index] for index in order]
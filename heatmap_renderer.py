@@ -0,0 +1,89 @@
+from functools import partial
+import os
+
+import numpy
+from PIL import Image
+
+from heatmap import Heatmapper
+
+_asset_file = partial(os.path.join, os.path.dirname(__file__), 'assets')
+
+
+class HeatmapRenderer:
+    """
+    Класс, строящий тепловые карты интерфейсов с однократной загрузкой ресурсов: фоновое изображение каждого размера,
+    цветовая карта и изображение точки декодируются один раз и хранятся в памяти
+    """
+    def __init__(self, colours='default', grey_heatmapper='PIL'):
+        """
+        :param colours: цветовая карта, см. Heatmapper
+        :param grey_heatmapper: реализация GreyHeatMapper - 'PIL' | 'NumPy' | 'PySide' или готовый объект
+        """
+        # Heatmapper строит цветовую карту и загружает изображение точки при создании
+        self.heatmapper = Heatmapper(colours=colours, grey_heatmapper=grey_heatmapper)
+        self._base_images = {}
+
+    def get_base_image(self, width, height):
+        """ Функция, возвращающая фоновое изображение (base.png) размером width x height """
+        base_image = self._base_images.get((width, height))
+        if base_image is None:
+            with Image.open(_asset_file('base.png')) as image:
+                base_image = image.resize((width, height)).convert('RGBA')
+            self._base_images[(width, height)] = base_image
+        return base_image
+
+    def heatmap(self, points, width, height):
+        """
+        Функция, формирующая PIL изображение тепловой карты размером width x height
+        :param points: список кортежей вида (x, y, width, height, intensity)
+        """
+        return self.heatmapper.heatmap_on_img(points, self.get_base_image(width, height))
+
+    def grey_field(self, points, width, height):
+        """
+        Функция, формирующая поле интенсивности тепла (без раскраски цветовой картой и наложения на фон)
+        :param points: список кортежей вида (x, y, width, height, intensity)
+        :return: массив numpy.float64 размером (height, width) со значениями от 0 (горячо) до 255
+        """
+        grey_heatmapper = self.heatmapper.grey_heatmapper
+        # NumPy реализация отдаёт поле без промежуточного PIL изображения
+        if hasattr(grey_heatmapper, 'log_heat'):
+            with numpy.errstate(under='ignore'):
+                return 255 * numpy.exp(grey_heatmapper.log_heat(width, height, points))
+        return numpy.asarray(grey_heatmapper.heatmap(width, height, points), dtype=numpy.float64)
+
+    def get_parameters(self):
+        """
+        Функция, возвращающая параметры, от которых зависят построенные тепловые карты (для ключей постоянного кэша):
+        цветовая карта, прозрачность, реализация GreyHeatMapper, диаметр и сила точки
+        """
+        heatmapper = self.heatmapper
+        colours = heatmapper.colours if isinstance(heatmapper.colours, str) else heatmapper.colours.name
+        grey_heatmapper = heatmapper.grey_heatmapper
+        return (colours, heatmapper.opacity, type(grey_heatmapper).__name__, grey_heatmapper.point_diameter,
+                grey_heatmapper.point_strength)
+
+    def sprite_cache_info(self):
+        """
+        Функция, возвращающая статистику кэша изображений точек (hits, misses, maxsize, currsize)
+        или None, если используемый GreyHeatMapper не кэширует изображения
+        """
+        sprite_cache = getattr(self.heatmapper.grey_heatmapper, 'sprite_cache', None)
+        return sprite_cache.info() if sprite_cache else None
+
+
+_renderer = None
+
+
+def get_renderer():
+    """ Функция, возвращающая общий для всего процесса экземпляр HeatmapRenderer """
+    global _renderer
+    if _renderer is None:
+        _renderer = HeatmapRenderer()
+    return _renderer
+
+
+def set_renderer(renderer):
+    """ Функция, заменяющая общий для всего процесса экземпляр HeatmapRenderer """
+    global _renderer
+    _renderer = renderer
@@ -0,0 +1,185 @@
+"""
+Запуск оптимизации интерфейса из командной строки, без графического интерфейса Qt:
+
+    python -m interface_opt run --ref data.json --target data2.json --algo ga --canvas 700x800
+    python -m interface_opt batch --ref data.json --targets data2.json short2.json --output-dir results
+    python -m interface_opt convert data.json data.snap
+"""
+
+import argparse, os, sys
+
+from engine import OptimizationEngine, Reference, ALGORITHMS, FITNESS_MODES, load_tree, load_reference, save_tree
+from ga import ELITISM_COUNT, SELECTION, SELECTION_METHODS
+from bees import FOOD_SOURCES_COUNT, TRIAL_LIMIT
+from charges import CHARGES_COUNT, MEMORY_SIZE
+from islands import MIGRATION_INTERVAL, MIGRATION_SIZE
+from heatmap_renderer import HeatmapRenderer, get_renderer, set_renderer
+from snapshot import is_snapshot, save_snapshot
+from batch import RESULTS_FILE, run_batch
+from reference_cache import CACHE_DIR, ReferenceCache
+
+
+def parse_canvas(value):
+    """ Функция, разбирающая размер холста вида WIDTHxHEIGHT """
+    try:
+        width, height = (int(size) for size in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("canvas must look like WIDTHxHEIGHT, e.g. 700x800")
+    if width <= 2 or height <= 2:
+        raise argparse.ArgumentTypeError("canvas must be larger than 2x2")
+    return width, height
+
+
+def print_statistics(engine, algorithm):
+    """ Функция, выводящая текущую статистику работы выбранного алгоритма """
+    print("{} iteration {}: current FF {:.0f}, best FF {:.0f}, useless iterations {}".format(
+        algorithm, engine.count_iterations, engine.current_ff_value, engine.best_ff_value,
+        engine.count_useless_iterations))
+
+
+def get_algorithm_options(args):
+    """ Функция, возвращающая параметры OptimizationEngine, общие для команд run и batch """
+    return dict(fitness=args.fitness, population_size=args.population, elitism=args.elitism,
+                selection=args.selection, food_sources=args.food_sources, trial_limit=args.trial_limit,
+                charges_count=args.charges_count, memory_size=args.memory_size)
+
+
+def get_reference_cache(args):
+    """ Функция, возвращающая постоянный кэш эталонных интерфейсов (None, если он отключён --no-cache) """
+    return None if args.no_cache else ReferenceCache(args.cache_dir)
+
+
+def run(args):
+    """ Обработчик команды run: оптимизирует тестируемый интерфейс по эталонному """
+    width, height = args.canvas
+    set_renderer(HeatmapRenderer(grey_heatmapper=args.grey_heatmapper))
+    reference_cache = get_reference_cache(args)
+    if reference_cache is not None:
+        reference = reference_cache.get_reference(args.ref, width, height, (args.fitness,))
+    else:
+        reference = Reference.from_tree(load_reference(args.ref), width, height, (args.fitness,))
+    engine = OptimizationEngine(None, load_tree(args.target), width, height, reference=reference,
+                                processes=args.processes, islands=args.islands,
+                                migration_interval=args.migration_interval, migration_size=args.migration_size,
+                                **get_algorithm_options(args))
+    if not args.quiet:
+        engine.on_generation = print_statistics
+
+    best_tree = engine.run(args.algo)
+    print("Best FF value: {:.0f} ({} iterations)".format(engine.best_ff_value, engine.count_iterations))
+    if reference_cache is not None:
+        print("Reference cache: {} hits, {} misses ({})".format(reference_cache.hits, reference_cache.misses,
+                                                                reference_cache.directory))
+    cache_info = get_renderer().sprite_cache_info()
+    if cache_info:
+        print("Sprite cache: {} hits, {} misses, {}/{} sprites".format(cache_info.hits, cache_info.misses,
+                                                                       cache_info.currsize, cache_info.maxsize))
+    # Острова ГА оценивают особей в своих процессах с собственными кэшами - кэш движка не используется
+    if args.algo == "bees" or (args.algo == "ga" and args.islands == 1):
+        ff_cache = engine.ff_cache
+        print("Fitness cache: {} hits, {} misses ({:.0%} hit rate)".format(ff_cache.hits, ff_cache.misses,
+                                                                           ff_cache.hit_rate()))
+
+    if args.output:
+        save_tree(best_tree, args.output)
+    return 0
+
+
+def batch(args):
+    """ Обработчик команды batch: оптимизирует несколько тестируемых интерфейсов по одному эталонному """
+    width, height = args.canvas
+    set_renderer(HeatmapRenderer(grey_heatmapper=args.grey_heatmapper))
+
+    def print_result(result):
+        if result.error:
+            print("{}: failed ({})".format(result.target, result.error))
+        else:
+            print("{}: best FF value {:.0f} ({} iterations) -> {}".format(result.target, result.best_ff_value,
+                                                                         result.count_iterations, result.output))
+
+    results = run_batch(args.ref, args.targets, args.output_dir, width, height, args.algo, args.workers,
+                        print_result, get_reference_cache(args), **get_algorithm_options(args))
+    print("Results saved to {}".format(os.path.join(args.output_dir, RESULTS_FILE)))
+    return 1 if any(result.error for result in results) else 0
+
+
+def convert(args):
+    """ Обработчик команды convert: преобразует JSON файл интерфейса в двоичный снимок и обратно """
+    tree = load_tree(args.input)
+    if is_snapshot(args.input):
+        save_tree(tree, args.output)
+    else:
+        save_snapshot(tree, args.output)
+    print("Converted {} nodes: {} -> {}".format(len(tree.get_nodes()), args.input, args.output))
+    return 0
+
+
+def add_algorithm_arguments(parser):
+    """ Функция, добавляющая параметры алгоритмов оптимизации и кэша эталонов, общие для команд run и batch """
+    parser.add_argument("--algo", choices=ALGORITHMS, default="ga", help="optimization algorithm")
+    parser.add_argument("--canvas", type=parse_canvas, default=(700, 800), help="heatmap size, WIDTHxHEIGHT")
+    parser.add_argument("--fitness", choices=FITNESS_MODES, default="heatmap",
+                        help="compare colourised heatmaps (as the GUI does) or raw grey heat fields")
+    parser.add_argument("--grey-heatmapper", choices=("PIL", "NumPy"), default="PIL",
+                        help="backend drawing the greyscale heat field")
+    parser.add_argument("--population", type=int, help="GA population size (default: the original three-parent GA)")
+    parser.add_argument("--elitism", type=int, default=ELITISM_COUNT,
+                        help="best GA individuals copied to the next generation unchanged")
+    parser.add_argument("--selection", choices=SELECTION_METHODS, default=SELECTION, help="GA parent selection method")
+    parser.add_argument("--food-sources", type=int, default=FOOD_SOURCES_COUNT,
+                        help="bee colony food sources (employed and onlooker bees per cycle)")
+    parser.add_argument("--trial-limit", type=int, default=TRIAL_LIMIT,
+                        help="failed improvement attempts before a bee colony food source is abandoned")
+    parser.add_argument("--charges-count", type=int, default=CHARGES_COUNT,
+                        help="charged particles of the charged system search")
+    parser.add_argument("--memory-size", type=int, default=MEMORY_SIZE, help="best layouts kept in the charged memory")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help="directory of the persistent cache of prepared destination heatmaps and energies")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="prepare the destination interface from scratch, bypassing the persistent cache")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="interface_opt", description="Headless interface heatmap optimization")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser("run", help="optimize a test interface against a destination one")
+    run_parser.add_argument("--ref", required=True, help="destination interface JSON file or binary snapshot")
+    run_parser.add_argument("--target", required=True, help="test interface JSON file or binary snapshot")
+    add_algorithm_arguments(run_parser)
+    run_parser.add_argument("--processes", type=int, default=1,
+                            help="worker processes scoring GA children and bee candidates in parallel (1 = no pool)")
+    run_parser.add_argument("--islands", type=int, default=1,
+                            help="GA islands, each evolving its own population in a separate process (1 = no islands)")
+    run_parser.add_argument("--migration-interval", type=int, default=MIGRATION_INTERVAL,
+                            help="GA generations between migrations of the best individuals to the next island")
+    run_parser.add_argument("--migration-size", type=int, default=MIGRATION_SIZE,
+                            help="best individuals each island sends to the next one on migration")
+    run_parser.add_argument("--output", help="JSON file to save the best interface to")
+    run_parser.add_argument("--quiet", action="store_true", help="do not print per-iteration statistics")
+    run_parser.set_defaults(handler=run)
+
+    batch_parser = subparsers.add_parser("batch", help="optimize many test interfaces against one destination")
+    batch_parser.add_argument("--ref", required=True, help="destination interface JSON file or binary snapshot")
+    batch_parser.add_argument("--targets", required=True, nargs="+",
+                              help="test interface JSON files or binary snapshots")
+    batch_parser.add_argument("--output-dir", required=True,
+                              help="directory for the best interface of every target and {}".format(RESULTS_FILE))
+    batch_parser.add_argument("--workers", type=int,
+                              help="worker processes optimizing targets in parallel (default: one per CPU)")
+    add_algorithm_arguments(batch_parser)
+    batch_parser.set_defaults(handler=batch)
+
+    convert_parser = subparsers.add_parser("convert", help="convert an interface JSON file to a binary snapshot "
+                                                           "(or a snapshot back to JSON)")
+    convert_parser.add_argument("input", help="interface JSON file or binary snapshot")
+    convert_parser.add_argument("output", help="file to write the snapshot (or JSON) to")
+    convert_parser.set_defaults(handler=convert)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
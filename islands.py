@@ -0,0 +1,155 @@
+import random
+from multiprocessing import Pipe, Process
+
+import numpy
+
+from ga import GA, POPULATION_SIZE, ELITISM_COUNT, SELECTION, TOURNAMENT_SIZE
+from heatmap import NumPyGreyHeatmapper
+from heatmap_renderer import HeatmapRenderer, get_renderer, set_renderer
+from fitness_functions import FitnessCache
+from layout import Layout
+
+# Параметры островной модели ГА
+ISLANDS_COUNT = 4
+MIGRATION_INTERVAL = 5
+MIGRATION_SIZE = 2
+
+
+def get_coordinates(tree):
+    """
+    Функция, возвращающая координаты узлов дерева в порядке обхода в глубину - между островами передаются только они
+    :return: numpy массив размером (n, 2) со строками вида (left, top)
+    """
+    return numpy.array([(element.left, element.top) for element in tree.get_nodes()]).reshape(-1, 2)
+
+
+def set_coordinates(tree, coordinates, structure):
+    """
+    Функция, возвращающая копию дерева tree с координатами узлов coordinates (get_coordinates дерева той же структуры):
+    копируются только узлы с изменёнными координатами (Layout.to_tree)
+    :param structure: Layout дерева tree (Layout.from_tree) - строится один раз для всех вызовов
+    """
+    layout = structure.copy()
+    layout.left, layout.top = coordinates[:, 0], coordinates[:, 1]
+    return layout.to_tree(tree)
+
+
+def _run_island(connection, tree, parameters, seed, grey_heatmapper):
+    """
+    Функция, выполняемая процессом острова: популяционный ГА (GA.generation) над собственной популяцией.
+    По каждой команде (generations, migrants) мигранты замещают худших особей, затем выполняется generations
+    поколений; в ответ передаются лучшие особи каждого поколения и эмигранты - лучшие особи последнего поколения
+    """
+    scale_x, scale_y, width, height, destination_heatmap, population_size, elitism, selection, tournament_size, \
+        migration_size = parameters
+    set_renderer(HeatmapRenderer(grey_heatmapper=grey_heatmapper))
+    # Начальное состояние генератора случайных чисел острова задаётся зерном из основного процесса, поэтому
+    # запуск воспроизводим при заданном в нём random.seed (сам процесс получает случайное состояние)
+    random.seed(seed)
+
+    ga = GA()
+    ff_cache = FitnessCache()
+    structure = Layout.from_tree(tree)
+    iteration = 0
+    population = ga.initial_population(tree, population_size)
+    ff_values = ga.estimate_ff_values(population, scale_x, scale_y, width, height, destination_heatmap, iteration,
+                                      ff_cache)
+
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        generations, migrants = message
+
+        # Мигранты (их значения фитнесс-функции уже вычислены соседним островом) замещают худших особей
+        order = sorted(range(len(population)), key=lambda index: ff_values[index])
+        for index, (ff_value, coordinates) in zip(reversed(order), migrants):
+            population[index] = set_coordinates(tree, coordinates, structure)
+            ff_values[index] = ff_value
+
+        best = []
+        for _ in range(generations):
+            population, ff_values = ga.generation(population, ff_values, scale_x, scale_y, width, height,
+                                                  destination_heatmap, iteration, elitism, selection,
+                                                  tournament_size, ff_cache)
+            iteration += 1
+            best.append((ff_values[0], get_coordinates(population[0])))
+
+        emigrants = [(ff_values[index], get_coordinates(population[index])) for index in range(migration_size)]
+        connection.send((best, emigrants))
+
+    connection.close()
+
+
+class IslandModel:
+    """
+    Класс, реализующий островную модель ГА: несколько независимых популяций, каждая в своём процессе.
+    Каждые migration_interval поколений лучшие особи острова переходят на следующий остров кольца.
+    Эталонная тепловая карта и исходное дерево передаются процессу один раз при запуске, а между островами -
+    только значения фитнесс-функции и координаты узлов (get_coordinates), а не граф объектов Node
+    """
+    def __init__(self, tree, scale_x, scale_y, width, height, destination_heatmap, islands=ISLANDS_COUNT,
+                 population_size=POPULATION_SIZE, elitism=ELITISM_COUNT, selection=SELECTION,
+                 tournament_size=TOURNAMENT_SIZE, migration_size=MIGRATION_SIZE):
+        """
+        :param tree: дерево элементов оптимизируемого интерфейса (начальная популяция каждого острова - его мутации)
+        :param islands: количество островов (процессов)
+        :param migration_size: количество особей, переходящих с острова на соседний при миграции
+        """
+        self.tree = tree
+        self.structure = Layout.from_tree(tree)
+
+        # Процессы строят тепловые карты той же реализацией GreyHeatMapper, что и основной процесс
+        numpy_heatmapper = isinstance(get_renderer().heatmapper.grey_heatmapper, NumPyGreyHeatmapper)
+        parameters = (scale_x, scale_y, width, height, destination_heatmap, population_size, elitism, selection,
+                      tournament_size, migration_size)
+
+        self.connections = []
+        self.processes = []
+        for _ in range(islands):
+            connection, island_connection = Pipe()
+            process = Process(target=_run_island, daemon=True,
+                              args=(island_connection, tree, parameters, random.random(),
+                                    'NumPy' if numpy_heatmapper else 'PIL'))
+            process.start()
+            island_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+        # Мигранты, которые получит каждый остров со следующей командой
+        self.migrants = [[] for _ in range(islands)]
+
+    def epoch(self, generations):
+        """
+        Функция, выполняющая generations поколений на всех островах одновременно и последующую миграцию
+        :return: список кортежей (значение фитнесс-функции, координаты) лучшей особи всех островов в каждом поколении
+        """
+        for connection, migrants in zip(self.connections, self.migrants):
+            connection.send((generations, migrants))
+        results = [connection.recv() for connection in self.connections]
+
+        # Кольцевая миграция: эмигранты острова i становятся мигрантами острова i + 1
+        self.migrants = [results[index - 1][1] for index in range(len(results))]
+
+        return [min(generation, key=lambda best: best[0]) for generation in zip(*(best for best, _ in results))]
+
+    def get_tree(self, coordinates):
+        """ Функция, возвращающая дерево с координатами узлов coordinates, полученными от острова """
+        return set_coordinates(self.tree, coordinates, self.structure)
+
+    def close(self):
+        """ Функция, завершающая процессы островов """
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self.processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,185 @@
+import copy, hashlib, random
+
+import numpy
+
+
+class Layout:
+    """
+    Класс, описывающий расположение элементов дерева интерфейса в виде массивов numpy (структура массивов).
+    Узлы пронумерованы в порядке обхода в глубину, поэтому поддерево узла i занимает индексы [i, subtree_end[i]):
+    перемещение поддерева - сложение со срезом, копия варианта - копия двух массивов (left и top).
+    Node/Tree остаются форматом загрузки и отображения, Layout - рабочим представлением для оптимизации
+    (частицы поиска системой зарядов, файл charges.py)
+    """
+    def __init__(self, left, top, width, height, subtree_end, parent, depth, identifier, children, is_li):
+        # Изменяемые при оптимизации координаты
+        self.left = left
+        self.top = top
+        # Неизменяемая структура дерева (общая для всех копий)
+        self.width = width
+        self.height = height
+        self.subtree_end = subtree_end
+        self.parent = parent
+        self.depth = depth
+        self.identifier = identifier
+        self.children = children
+        self.is_li = is_li
+        self.max_depth = int(depth.max()) if len(depth) else 0
+        self.leaves = numpy.nonzero(subtree_end - numpy.arange(len(subtree_end)) == 1)[0]
+
+    @staticmethod
+    def from_tree(tree):
+        """
+        Функция, строящая Layout по дереву элементов типа Tree (файл node.py)
+        :return: Layout с теми же координатами узлов
+        """
+        nodes = tree.get_nodes()
+        index = {id(element): number for number, element in enumerate(nodes)}
+
+        parent = numpy.full(len(nodes), -1, dtype=numpy.int64)
+        subtree_end = numpy.arange(1, len(nodes) + 1, dtype=numpy.int64)
+        children = []
+        for number, element in enumerate(nodes):
+            child_indexes = numpy.array([index[id(child)] for child in element.children], dtype=numpy.int64)
+            parent[child_indexes] = number
+            children.append(child_indexes)
+
+        # Конец поддерева узла - конец поддерева его последнего потомка (обход от листьев к корню)
+        for number in range(len(nodes) - 1, -1, -1):
+            if len(children[number]):
+                subtree_end[number] = subtree_end[children[number][-1]]
+
+        # Все координаты и размеры храним в одном типе, чтобы сдвиги на разницу размеров не меняли тип массивов
+        geometry = numpy.array([(element.left, element.top, element.width, element.height) for element in nodes])
+        geometry = geometry.reshape(-1, 4)
+        return Layout(geometry[:, 0].copy(), geometry[:, 1].copy(), geometry[:, 2].copy(), geometry[:, 3].copy(),
+                      subtree_end, parent, numpy.array([element.depth for element in nodes], dtype=numpy.int64),
+                      numpy.array([element.identifier for element in nodes], dtype=numpy.int64), children,
+                      numpy.array([element.tag_name == "li" for element in nodes], dtype=bool))
+
+    def copy(self):
+        """ Функция, возвращающая копию варианта расположения (структура дерева не копируется) """
+        layout = copy.copy(self)
+        layout.left = self.left.copy()
+        layout.top = self.top.copy()
+        return layout
+
+    def to_tree(self, tree):
+        """
+        Функция, возвращающая копию дерева tree той же структуры с координатами данного варианта (для отображения
+        и сохранения): копируются только узлы с изменёнными координатами и пути к ним от корня (Tree.writable)
+        """
+        result = tree.copy()
+        nodes = tree.get_nodes()
+        current = numpy.array([(element.left, element.top) for element in nodes]).reshape(-1, 2)
+        changed = numpy.nonzero((current[:, 0] != self.left) | (current[:, 1] != self.top))[0]
+        for index, left, top in zip(changed.tolist(), self.left[changed].tolist(), self.top[changed].tolist()):
+            element = result.writable(nodes[index])
+            element.left = left
+            element.top = top
+        return result
+
+    def move(self, index, dx, dy):
+        """ Функция, сдвигающая узел index вместе со всеми дочерними узлами на (dx, dy) """
+        end = self.subtree_end[index]
+        self.left[index:end] += dx
+        self.top[index:end] += dy
+
+    def change_elements_x(self, children, i, j):
+        """
+        Функция, изменяющая положение i-ого и j-ого (и всех, что между ними) элементов списка children по оси x
+        (та же логика, что и PopulationAlgorithms.change_elements_x)
+        """
+        first, second = children[i], children[j]
+        if self.left[first] == self.left[second]:
+            return
+        min_x = min(self.left[first], self.left[second])
+        max_x = max(self.left[first], self.left[second])
+        if min_x != self.left[first]:
+            first, second = second, first
+        correction = self.width[second] - self.width[first]
+        for child in children[(self.left[children] > min_x) & (self.left[children] < max_x)]:
+            self.move(child, correction, 0)
+        self.move(first, self.left[second] + correction - self.left[first], 0)
+        self.move(second, min_x - self.left[second], 0)
+
+    def change_elements_y(self, children, i, j):
+        """
+        Функция, изменяющая положение i-ого и j-ого (и всех, что между ними) элементов списка children по оси y
+        (та же логика, что и PopulationAlgorithms.change_elements_y)
+        """
+        first, second = children[i], children[j]
+        if self.top[first] == self.top[second]:
+            return
+        min_y = min(self.top[first], self.top[second])
+        max_y = max(self.top[first], self.top[second])
+        if min_y != self.top[first]:
+            first, second = second, first
+        correction = self.height[second] - self.height[first]
+        for child in children[(self.top[children] > min_y) & (self.top[children] < max_y)]:
+            self.move(child, 0, correction)
+        self.move(first, 0, self.top[second] + correction - self.top[first])
+        self.move(second, 0, min_y - self.top[second])
+
+    def change_elements(self, index, i, j):
+        """ Функция, изменяющая положение i-ого и j-ого (и всех, что между ними) дочерних элементов узла index """
+        self.change_elements_x(self.children[index], i, j)
+        self.change_elements_y(self.children[index], i, j)
+
+    def mutation(self, chance):
+        """
+        Функция, выполняющая случайное изменение положения элементов (как GA.mutation и Bees.move_bees):
+        у каждого узла с несколькими дочерними элементами с шансом chance меняются местами два из них
+        """
+        for index, children in enumerate(self.children):
+            if len(children) > 1:
+                if chance > random.random():
+                    # Формируем случайные индексы из номеров дочерних узлов
+                    index1 = random.randint(0, len(children)-1)
+                    index2 = random.randint(0, len(children)-1)
+                    while index1 == index2:
+                        index2 = random.randint(0, len(children)-1)
+                    # Меняем местрами элементы с установленными номерами, если это не пункты меню li
+                    if not (self.is_li[children[index1]] and self.is_li[children[index2]]):
+                        self.change_elements(index, index1, index2)
+
+    def take_children_positions(self, index, partner):
+        """
+        Функция, перемещающая дочерние элементы узла index (вместе с их поддеревьями) в положения соответствующих
+        элементов варианта partner той же структуры (как PopulationAlgorithms.take_children_positions)
+        :return: True, если хотя бы один элемент был перемещён
+        """
+        children = self.children[index]
+        moves = zip(children.tolist(), (partner.left[children] - self.left[children]).tolist(),
+                    (partner.top[children] - self.top[children]).tolist())
+        moved = False
+        for child, dx, dy in moves:
+            if dx or dy:
+                self.move(child, dx, dy)
+                moved = True
+        return moved
+
+    def get_points(self, scale_x, scale_y):
+        """
+        Функция, возвращающая точки интенсивности тепла на тепловой карте (как FitnessFunctions.get_points)
+        :return: список кортежей вида (x, y, width, height, intensity)
+        """
+        leaves = self.leaves[self.depth[self.leaves] + (6 - self.max_depth) >= 0]
+        columns = (numpy.trunc(self.left[leaves] / scale_x).astype(numpy.int64),
+                   numpy.trunc(self.top[leaves] / scale_y).astype(numpy.int64),
+                   numpy.trunc(self.width[leaves] / scale_x).astype(numpy.int64),
+                   numpy.trunc(self.height[leaves] / scale_y).astype(numpy.int64),
+                   (self.depth[leaves] + (6 - self.max_depth)) / 6)
+        return list(zip(*(column.tolist() for column in columns)))
+
+    def get_charges(self):
+        """
+        Функция, возвращающая массив зарядов системы (как FitnessFunctions.get_charges)
+        :return: numpy массив размером (n, 5) со строками вида (left, top, width, height, depth)
+        """
+        return numpy.column_stack((self.left, self.top, self.width, self.height, self.depth)).astype(numpy.float64)
+
+    def get_layout_key(self):
+        """ Функция, возвращающая хэш расположения элементов (тот же, что FitnessCache.get_layout_key для дерева) """
+        layout = numpy.column_stack((self.identifier, self.left, self.top)).astype(numpy.float64)
+        return hashlib.blake2b(layout.tobytes(), digest_size=16).digest()
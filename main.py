@@ -1,18 +1,19 @@
-import sys, os, copy, json
-from functools import partial
+import sys, time
 
-from PIL import Image, ImageQt
+from PIL import ImageQt
 from PyQt5 import QtWidgets
-from PyQt5.QtCore import Qt, QObject, pyqtSignal
+from PyQt5.QtCore import Qt, QObject, QTimer, pyqtSignal
 from PyQt5.QtGui import QPen, QBrush, QColor, QPixmap
 
-from heatmap import Heatmapper
-from node import Node, Tree
+from heatmap_renderer import get_renderer
+from tree_loader import load_tree
+from reference_cache import ReferenceCache
 from user_interface import UiMainWindow
 from evolution import EvolutionThread
 from fitness_functions import FitnessFunctions
 
 PRINT_INFO = 0
+MAX_FRAMES_PER_SECOND = 10
 
 
 class InterfaceOptimization:
@@ -42,15 +43,18 @@ class InterfaceOptimization:
         self.optimized_tree_group = QtWidgets.QGraphicsItemGroup()
         self.optimized_heatmap_group = QtWidgets.QGraphicsItemGroup()
 
+        # Элементы сцены оптимизируемого интерфейса создаются один раз при загрузке и далее только перемещаются:
+        # прямоугольники элементов по идентификатору узла и изображение тепловой карты
+        self.optimized_items = {}
+        self.optimized_heatmap_item = None
+        self.optimized_heatmap_outdated = False
+
         # Инициализируем коэффициенты пропорциональности реальных размеров и размеров на graphicsView
         self.initial_scale_x = 1
         self.initial_scale_y = 1
         self.optimized_scale_x = 1
         self.optimized_scale_y = 1
 
-        # Идентификатор узлов дерева
-        self.identifier = 1
-
         # Инициализируем списки точек для тепловых карт
         self.initial_points = []
         self.optimized_points = []
@@ -71,9 +75,17 @@ class InterfaceOptimization:
         # Энергия системы зарядов эталонного интерфейса и коэффициент пропорциональности ФФ алгоритма системы зарядов
         self.initial_energy = 0
 
-        # Создаём экземпляр класса событий
+        # Подготовленный эталонный интерфейс (тепловая карта и энергия) берётся из постоянного кэша на диске
+        self.reference_cache = ReferenceCache()
+        self.reference = None
+        self.initial_file_name = None
+
+        # Создаём экземпляр класса событий (поток оптимизации не ждёт обработки результатов поколений)
         self.events = Events()
-        self.events.generation_completed[str].connect(self.update_generation)
+        self.events.generation_completed.connect(self.update_generation)
+
+        # Перерисовка сцены не чаще MAX_FRAMES_PER_SECOND раз в секунду
+        self.frame_publisher = FramePublisher(self.draw_frame)
 
         # Поток для выполнения процесса эволюции по выбранному алгоритму
         self.evolution = None
@@ -91,29 +103,25 @@ class InterfaceOptimization:
         # Запускаем бесконечный цикл обработки событий в PyQt
         sys.exit(app.exec_())
 
-    def update_generation(self, algorithm):
+    def update_generation(self, result):
         """
         Обработчик события получения нового поколения интерфейсов одним из алгоритмов
-        :param algorithm: название алгоритма - "ga" | "bees" | "charges"
+        :param result: GenerationResult - снимок дерева и статистика, уже посчитанные в потоке оптимизации
         """
-        # Перерисовываем элементы дерева на QGraphicsView
-        self.update_interface()
-
-        # Пересчитываем статистику и выводим её
-        self.count_iterations += 1
-        if algorithm == "ga" or algorithm == "bees":
-            self.current_ff_value = FitnessFunctions.get_ff_value(self.destination_heatmap, self.current_heatmap)
-        else:
-            self.current_ff_value = \
-                FitnessFunctions.get_ff_value_charges(self.optimized_tree, self.ui.optimizedView.width(),
-                                                      self.ui.optimizedView.height(), self.initial_energy)
-
-        if self.current_ff_value < self.best_ff_value:
-            self.best_ff_value = self.current_ff_value
-            self.count_useless_iterations = 0
-            self.best_tree = copy.deepcopy(self.optimized_tree)
-        else:
-            self.count_useless_iterations += 1
+        self.optimized_tree = result.tree
+        self.best_tree = result.best_tree
+        self.count_iterations = result.count_iterations
+        self.count_useless_iterations = result.count_useless_iterations
+        self.current_ff_value = result.current_ff_value
+        self.best_ff_value = result.best_ff_value
+
+        # Перерисовываем элементы дерева на QGraphicsView и выводим статистику не чаще MAX_FRAMES_PER_SECOND раз
+        # в секунду. Снимок дерева (Tree.copy) не изменяется при дальнейшей работе потока оптимизации
+        self.frame_publisher.publish(result.tree)
+
+    def draw_frame(self, tree):
+        """ Функция, отображающая последнее полученное поколение интерфейсов и текущую статистику """
+        self.update_interface(tree)
         self.show_statistics()
 
     def load_destination(self):
@@ -134,31 +142,23 @@ class InterfaceOptimization:
         file_name = QtWidgets.QFileDialog.getOpenFileName(self.main_window, 'Load file', './', "*.json")
 
         if file_name[0]:
-            # Открываем json файл и считываем данные
-            with open(file_name[0]) as data_file:
-                data = json.load(data_file)
-
-            # Создаём корень дерева элементов
-            root = Node(data["tagName"], data["id"], data["className"], data["clientWidth"],
-                        data["clientHeight"], data["clientTop"], data["clientLeft"])
-            children = data["children"]
-            tree = Tree(root)
+            # Считываем json файл частями сразу в дерево элементов (глубины узлов и индекс уже вычислены)
+            tree = load_tree(file_name[0])
 
             if view == self.ui.initialView:
                 self.initial_tree = tree
+                self.initial_file_name = file_name[0]
                 self.loaded_interfaces[0] = True
                 if PRINT_INFO:
                     print("====================== INITIAL TREE ======================")
             else:
                 self.optimized_tree = tree
-                self.best_tree = copy.deepcopy(tree)
+                self.best_tree = tree.copy()
                 self.loaded_interfaces[1] = True
                 if PRINT_INFO:
                     print("====================== OPTIMIZED TREE ======================")
 
-            # Вызываем функцию заполнения дерева и выводим структуру дерева
-            self.identifier = 1
-            self.fill_tree(root, children)
+            # Выводим структуру дерева
             if PRINT_INFO:
                 tree.draw_tree()
                 print()
@@ -175,26 +175,11 @@ class InterfaceOptimization:
 
             # Если оба интерфейса загружены - делаем доступными кнопки управления алгоритмами оттимизации
             if self.loaded_interfaces[0] and self.loaded_interfaces[1]:
+                self.reference = self.reference_cache.get_reference(self.initial_file_name,
+                                                                    self.ui.optimizedView.width(),
+                                                                    self.ui.optimizedView.height(), ("heatmap",))
+                self.initial_energy = self.reference.energy
                 self.enable_algorithm_buttons()
-                self.initial_energy = FitnessFunctions.get_energy(self.initial_tree, self.ui.optimizedView.width(),
-                                                                  self.ui.optimizedView.height())
-
-    def fill_tree(self, root, children):
-        """
-        Функция, добавляющая узлу дерева (root) дочерние узлы, содержащиеся в children, типа Node (файл node.py)
-        :param root: узел, к которому добавляются дочерние
-        :param children: список дочерних узлов
-        """
-        for child in children:
-            child_node = Node(child["tagName"], child["id"], child["className"], child["clientWidth"],
-                              child["clientHeight"],
-                              child["clientTop"], child["clientLeft"], self.identifier)
-            root.add_child(child_node)
-            self.identifier += 1
-
-            new_root = child_node
-            new_children = child["children"]
-            self.fill_tree(new_root, new_children)
 
     def draw_interface(self, view, scene, tree, points):
         """ Функция, отрисовывающая начальный вид интерфейса с помощью PyQt """
@@ -237,44 +222,75 @@ class InterfaceOptimization:
 
         # Заполняем созданные графические группы элементами и тепловыми картами соответственно
         points.clear()
-        self.fill_tree_group(tree, tree.root, tree_group, points, scale_x, scale_y)
+        items = None
+        if view == self.ui.optimizedView:
+            items = self.optimized_items = {}
+            self.optimized_heatmap_outdated = False
+        self.fill_tree_group(tree, tree.root, tree_group, points, scale_x, scale_y, items=items)
         self.fill_heatmap_group(view, points, heatmap_group)
 
         # Добавляем на сцены соответственные группы элементов и теповых карт
         scene.addItem(tree_group)
         scene.addItem(heatmap_group)
 
-    def update_interface(self):
-        """ Функция, выполняющая перерисовку сцены после изменения дерева """
-        # Очищаем сцену  группы для рисования новых элементов
-        self.optimized_scene.clear()
-        self.optimized_tree_group = QtWidgets.QGraphicsItemGroup()
-        self.optimized_heatmap_group = QtWidgets.QGraphicsItemGroup()
-
-        # Заполняем созданные графические группы элементами и тепловыми картами соответственно
-        points = []
-        self.fill_tree_group(self.optimized_tree, self.optimized_tree.root, self.optimized_tree_group, points,
-                             self.optimized_scale_x, self.optimized_scale_y)
-        self.fill_heatmap_group(self.ui.optimizedView, points, self.optimized_heatmap_group)
-
-        # Добавляем на сцены соответственные группы элементов и теповых карт
-        if self.ui.elementsCheckBox.isChecked():
-            self.optimized_scene.addItem(self.optimized_tree_group)
+    def update_interface(self, tree=None):
+        """
+        Функция, выполняющая перерисовку сцены после изменения дерева: элементы сцены не создаются заново,
+        перемещаются только прямоугольники узлов, положение которых изменилось
+        :param tree: отображаемое дерево той же структуры, что и загруженное (по умолчанию - optimized_tree)
+        """
+        if tree is None:
+            tree = self.optimized_tree
+
+        for element in tree.get_nodes():
+            item = self.optimized_items.get(element.identifier)
+            if item is None:
+                continue
+            x, y = int(element.left / self.optimized_scale_x), int(element.top / self.optimized_scale_y)
+            position = item.pos()
+            if position.x() != x or position.y() != y:
+                item.setPos(x, y)
+
+        # Тепловая карта строится, только если она отображается, иначе - при включении отображения
         if self.ui.heatmapCheckBox.isChecked():
-            self.optimized_scene.addItem(self.optimized_heatmap_group)
+            self.update_heatmap_pixmap(tree)
+        else:
+            self.current_heatmap = None
+            self.optimized_heatmap_outdated = True
+
+    def update_heatmap_pixmap(self, tree):
+        """ Функция, заменяющая изображение тепловой карты оптимизируемого интерфейса на тепловую карту дерева tree """
+        heatmap = FitnessFunctions.get_heatmap(tree, self.optimized_scale_x, self.optimized_scale_y,
+                                               self.ui.optimizedView.width(), self.ui.optimizedView.height())
+        self.current_heatmap = heatmap
+        self.optimized_heatmap_item.setPixmap(QPixmap().fromImage(ImageQt.ImageQt(heatmap)))
+        self.optimized_heatmap_outdated = False
+
+    def get_current_heatmap(self):
+        """ Функция, возвращающая PIL изображение тепловой карты оптимизируемого интерфейса """
+        if self.current_heatmap is None:
+            self.current_heatmap = FitnessFunctions.get_heatmap(self.optimized_tree, self.optimized_scale_x,
+                                                                self.optimized_scale_y, self.ui.optimizedView.width(),
+                                                                self.ui.optimizedView.height())
+        return self.current_heatmap
 
     # Функция для заполнения графической группы элементами веб-странице в виде прямоугольников и получения списка
     # кортежей, представляющих точки вида (x, y, width, height, intensity)
-    def fill_tree_group(self, tree, tree_root, group, points, scale_x, scale_y, depth=0):
+    def fill_tree_group(self, tree, tree_root, group, points, scale_x, scale_y, depth=0, items=None):
         """
         Функция для заполнения графической группы элементами веб-странице в виде прямоугольников и получения списка
         кортежей, представляющих точки вида (x, y, width, height, intensity)
+        :param items: словарь, в который добавляются прямоугольники элементов по идентификатору узла
         """
-        element = QtWidgets.QGraphicsRectItem(int(tree_root.left / scale_x), int(tree_root.top / scale_y),
-                                              int(tree_root.width / scale_x), int(tree_root.height / scale_y))
+        # Прямоугольник задаётся в собственных координатах и размещается на сцене через setPos,
+        # чтобы при перемещении элемента менять только его положение
+        element = QtWidgets.QGraphicsRectItem(0, 0, int(tree_root.width / scale_x), int(tree_root.height / scale_y))
+        element.setPos(int(tree_root.left / scale_x), int(tree_root.top / scale_y))
         element.setPen(QPen(QColor(0, 0, 0)))
         element.setBrush(QBrush(QColor(125, 125, 125, 50)))
         group.addToGroup(element)
+        if items is not None:
+            items[tree_root.identifier] = element
 
         if len(tree_root.children) == 0:
             text_label = tree_root.tag_name
@@ -283,7 +299,7 @@ class InterfaceOptimization:
             if tree_root.class_name:
                 text_label += "#{0}".format(tree_root.class_name)
             text = QtWidgets.QGraphicsSimpleTextItem(text_label, element)
-            text.setPos(tree_root.left / scale_x + 2, tree_root.top / scale_y + 2)
+            text.setPos(2, 2)
 
         max_depth = tree.get_max_depth()
         actual_depth = depth + (6 - max_depth)  # 6 - максимальное значение глубины для карты с 7 цветами
@@ -294,31 +310,26 @@ class InterfaceOptimization:
                            int(tree_root.width / scale_x), int(tree_root.height / scale_y), actual_depth/6))
 
         for child in tree_root.children:
-            self.fill_tree_group(tree, child, group, points, scale_x, scale_y, depth+1)
+            self.fill_tree_group(tree, child, group, points, scale_x, scale_y, depth+1, items)
 
     def fill_heatmap_group(self, view, points, group):
         """
         Функция для заполнения графической группы элементами тепловой карты, т.е. точками, описывающими интенсивность
         расположения элементов на данном конкретном месте интерфейса
         """
-        _asset_file = partial(os.path.join, os.path.dirname(__file__), 'assets')
+        heatmap = get_renderer().heatmap(points, view.width(), view.height())
 
-        image = Image.open(_asset_file('base.png'))
-        image = image.resize((view.width(), view.height()))
-
-        heatmap = Heatmapper(colours='default')
-        heatmap = heatmap.heatmap_on_img(points, image)
+        qt_image = ImageQt.ImageQt(heatmap)
+        pixmap = QPixmap().fromImage(qt_image)
+        qpixmap = QtWidgets.QGraphicsPixmapItem(pixmap)
+        group.addToGroup(qpixmap)
 
         # Сохраняем в переменную класса PIL изображение тепловой карты
         if view == self.ui.initialView:
             self.destination_heatmap = heatmap
         else:
             self.current_heatmap = heatmap
-
-        qt_image = ImageQt.ImageQt(heatmap)
-        pixmap = QPixmap().fromImage(qt_image)
-        qpixmap = QtWidgets.QGraphicsPixmapItem(pixmap)
-        group.addToGroup(qpixmap)
+            self.optimized_heatmap_item = qpixmap
 
     def enable_check_buttons(self):
         """ Функция, делающая доступными кнопки отображения """
@@ -334,7 +345,7 @@ class InterfaceOptimization:
 
         if self.ui.gaRadioButton.isChecked() or self.ui.beesRadioButton.isChecked():
             self.best_ff_value = self.current_ff_value = \
-                FitnessFunctions.get_ff_value(self.destination_heatmap, self.current_heatmap)
+                FitnessFunctions.get_ff_value(self.destination_heatmap, self.get_current_heatmap())
         if self.ui.chargesRadioButton.isChecked():
             self.best_ff_value = self.current_ff_value = \
                 FitnessFunctions.get_ff_value_charges(self.optimized_tree, self.ui.optimizedView.width(),
@@ -354,6 +365,9 @@ class InterfaceOptimization:
     def show_heatmaps(self):
         """ Функция, показывающая/скрывающая тепловые карты веб-интерфейса """
         if self.ui.heatmapCheckBox.isChecked():
+            # Пока тепловая карта была скрыта, её изображение не обновлялось
+            if self.optimized_heatmap_outdated:
+                self.update_heatmap_pixmap(self.optimized_tree)
             self.initial_scene.addItem(self.initial_heatmap_group)
             self.optimized_scene.addItem(self.optimized_heatmap_group)
         else:
@@ -366,31 +380,9 @@ class InterfaceOptimization:
         self.evolution.start()
 
     def save_heatmap(self, tree, save_name):
-        """ Функция, возвращаящая значение фитнесс-функции по различиям тепловых карт двух интерфейсов """
-        # Внутренняя функция для получения точек интенсивности тепла не тепловой карте
-        def get_points(tree, tree_root, points, depth=0):
-            max_depth = tree.get_max_depth()
-            actual_depth = depth + (6 - max_depth)  # 6 - максимальное значение глубины для карты с 7 цветами
-            # Добавляем точку в список вершин для построения тепловой карты
-            if len(tree_root.children) == 0 and actual_depth >= 0:
-                points.append((int(tree_root.left / self.optimized_scale_x),
-                               int(tree_root.top / self.optimized_scale_y),
-                               int(tree_root.width / self.optimized_scale_x),
-                               int(tree_root.height / self.optimized_scale_y), actual_depth/6))
-            for child in tree_root.children:
-                get_points(tree, child, points, depth+1)
-            pass
-
-        # Вызываем внутреннюю функция и получаем точки
-        points = []
-        get_points(tree, tree.root, points)
-
-        # Формируем тепловую карту для дерева элементов
-        _asset_file = partial(os.path.join, os.path.dirname(__file__), 'assets')
-        image = Image.open(_asset_file('base.png'))
-        image = image.resize((self.ui.optimizedView.width(), self.ui.optimizedView.height()))
-        heatmap = Heatmapper(colours='default')
-        heatmap = heatmap.heatmap_on_img(points, image)
+        """ Функция, сохраняющая на диск изображение тепловой карты дерева элементов """
+        heatmap = FitnessFunctions.get_heatmap(tree, self.optimized_scale_x, self.optimized_scale_y,
+                                               self.ui.optimizedView.width(), self.ui.optimizedView.height())
         heatmap.save('.\heatmaps\{}.png'.format(save_name))
 
     def show_statistics(self):
@@ -411,7 +403,7 @@ class InterfaceOptimization:
         self.count_useless_iterations = 0
 
         if self.ui.gaRadioButton.isChecked() or self.ui.beesRadioButton.isChecked():
-            self.current_ff_value = FitnessFunctions.get_ff_value(self.destination_heatmap, self.current_heatmap)
+            self.current_ff_value = FitnessFunctions.get_ff_value(self.destination_heatmap, self.get_current_heatmap())
         if self.ui.chargesRadioButton.isChecked():
             self.current_ff_value = \
                 FitnessFunctions.get_ff_value_charges(self.optimized_tree, self.ui.optimizedView.width(),
@@ -421,11 +413,49 @@ class InterfaceOptimization:
         self.show_statistics()
 
 
+class FramePublisher:
+    """
+    Класс, ограничивающий частоту перерисовки: кадры выводятся не чаще max_fps раз в секунду, промежуточные
+    состояния пропускаются, а отложенный кадр всегда показывает последнее опубликованное состояние
+    """
+    def __init__(self, draw, max_fps=MAX_FRAMES_PER_SECOND):
+        """
+        :param draw: функция, выводящая кадр, - вызывается с аргументами последнего вызова publish
+        """
+        self.draw = draw
+        self.interval = 1 / max_fps
+        self.last_frame_time = None
+        self.frame = None
+
+        # Таймер отложенного кадра (создаётся в потоке графического интерфейса)
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+
+    def publish(self, *frame):
+        """ Функция, публикующая новое состояние: выводит его сразу или откладывает до следующего кадра """
+        self.frame = frame
+        delay = 0 if self.last_frame_time is None else self.last_frame_time + self.interval - time.monotonic()
+        if delay <= 0:
+            self.flush()
+        elif not self.timer.isActive():
+            self.timer.start(int(delay * 1000) + 1)
+
+    def flush(self):
+        """ Функция, выводящая последнее опубликованное состояние, если оно ещё не выведено """
+        self.timer.stop()
+        if self.frame is None:
+            return
+        frame, self.frame = self.frame, None
+        self.last_frame_time = time.monotonic()
+        self.draw(*frame)
+
+
 class Events(QObject):
     """
     Класс, содержащий сигналы, срабатывающие в процессе работы популяционных алгоритмов
     """
-    generation_completed = pyqtSignal(str)
+    generation_completed = pyqtSignal(object)
 
 
 if __name__ == "__main__":
@@ -1,3 +1,6 @@
+import copy
+
+
 class Node:
     """
     Класс, описывающий узел дерева, содержащий всю необходимую информацию об элементе интерфейса
@@ -12,6 +15,9 @@ class Node:
         self.left = left
         self.children = []
         self.identifier = identifier
+        self.depth = 0
+        # Метка дерева, которому принадлежит узел (узлы с чужой меткой разделяются несколькими деревьями)
+        self.owner = None
 
     def add_child(self, child):
         """ Функция, добавляющая узел (child) в список дочерних (children) """
@@ -26,10 +32,27 @@ class Node:
 
 class Tree:
     """
-    Класс, описывающий дерево элементов интерфейса
+    Класс, описывающий дерево элементов интерфейса.
+    Глубина узлов, максимальная глубина, список листьев, индекс узлов по идентификатору, родительские узлы и
+    положения среди соседних узлов вычисляются один раз (при загрузке или при первом обращении): перемещения
+    элементов не меняют структуру дерева. При изменении структуры следует вызвать update_structure.
+
+    Копия дерева (copy) разделяет с исходным деревом все узлы: перед изменением узла алгоритм получает его
+    собственную копию через writable / writable_subtree, при этом копируются только изменяемые узлы и путь к ним
+    от корня (копирование при записи). Изменять узлы напрямую можно лишь в дереве, у которого нет копий
     """
     def __init__(self, root):
         self.root = root
+        self._nodes = None
+        self._leaves = None
+        self._max_depth = None
+        # Узлы дерева по идентификатору (у каждой копии дерева - свой словарь)
+        self._index = None
+        # Родительские узлы и положения среди соседних узлов по идентификатору (общие для всех копий дерева)
+        self._parent_ids = None
+        self._positions = None
+        # Метка узлов, принадлежащих только этому дереву
+        self._owner = object()
 
     def draw_tree(self, element="", depth=0):
         """ Функция, выводящая форматированное инфо обо всех узлах дерева """
@@ -40,25 +63,158 @@ class Tree:
         for child in element.children:
             self.draw_tree(child, depth+1)
 
-    def get_max_depth(self):
+    def update_structure(self):
+        """ Функция, вычисляющая глубину всех узлов, максимальную глубину дерева и список листьев """
+        self._nodes = []
+        self._leaves = []
+        self._max_depth = 0
+        self._index = {self.root.identifier: self.root}
+        self._parent_ids = {self.root.identifier: None}
+        self._positions = {self.root.identifier: 0}
+
+        # Обход в глубину с явным стеком, чтобы не упираться в ограничение глубины рекурсии
+        self.root.depth = 0
+        stack = [self.root]
+        while stack:
+            element = stack.pop()
+            self._nodes.append(element)
+            if element.depth > self._max_depth:
+                self._max_depth = element.depth
+            if not element.children:
+                self._leaves.append(element)
+            for position, child in enumerate(element.children):
+                child.depth = element.depth + 1
+                self._index[child.identifier] = child
+                self._parent_ids[child.identifier] = element.identifier
+                self._positions[child.identifier] = position
+            stack.extend(reversed(element.children))
+
+    def update_nodes(self):
+        """ Функция, обновляющая список узлов и листьев после копирования узлов при записи (структура та же) """
+        self._nodes = []
+        self._leaves = []
+        stack = [self.root]
+        while stack:
+            element = stack.pop()
+            self._nodes.append(element)
+            if not element.children:
+                self._leaves.append(element)
+            stack.extend(reversed(element.children))
+
+    def copy(self):
         """
-        Функция, находящая максимальную глубину дерева элементов
-        :return: максимальная глубина дерева элементов
+        Функция, возвращающая копию дерева, разделяющую с ним все узлы (O(n) только для словаря узлов).
+        После копирования ни одно из деревьев не считает общие узлы своими - оба копируют их перед изменением
         """
-        max_depth = 0
+        if self._index is None:
+            self.update_structure()
+        tree = copy.copy(self)
+        tree._index = dict(self._index)
+        tree._owner = object()
+        self._owner = object()
+        return tree
+
+    def copy_node(self, element):
+        """ Функция, создающая собственную копию узла element (дочерние узлы остаются общими) """
+        node = copy.copy(element)
+        node.children = list(element.children)
+        node.owner = self._owner
+        self._index[node.identifier] = node
+        # Списки узлов и листьев ссылаются на прежние объекты - они будут построены заново при обращении
+        self._nodes = None
+        self._leaves = None
+        return node
+
+    def writable(self, element):
+        """
+        Функция, возвращающая узел этого дерева с идентификатором element.identifier, который можно изменять:
+        если узел или его предки разделяются с другими деревьями, они копируются (от корня к узлу)
+        :return: собственный узел дерева типа Node
+        """
+        if self._index is None:
+            self.update_structure()
+
+        # Поднимаемся к корню, пока не встретим собственный узел дерева
+        path = []
+        identifier = element.identifier
+        while identifier is not None and self._index[identifier].owner is not self._owner:
+            path.append(identifier)
+            identifier = self._parent_ids[identifier]
 
-        def get_max_depth(element, depth=0):
-            nonlocal max_depth
-            if depth > max_depth:
-                max_depth = depth
+        # Копируем разделяемые узлы сверху вниз, заменяя их в списках дочерних узлов уже скопированных родителей
+        for identifier in reversed(path):
+            node = self.copy_node(self._index[identifier])
+            parent_identifier = self._parent_ids[identifier]
+            if parent_identifier is None:
+                self.root = node
+            else:
+                self._index[parent_identifier].children[self._positions[identifier]] = node
 
-            for child in element.children:
-                get_max_depth(child, depth+1)
+        return self._index[element.identifier]
 
-        get_max_depth(self.root)
-        return max_depth
+    def writable_subtree(self, element):
+        """
+        Функция, возвращающая изменяемый узел этого дерева с идентификатором element.identifier,
+        все дочерние узлы которого (на любой глубине) также принадлежат только этому дереву
+        """
+        element = self.writable(element)
+        stack = [element]
+        while stack:
+            node = stack.pop()
+            for position, child in enumerate(node.children):
+                if child.owner is not self._owner:
+                    child = node.children[position] = self.copy_node(child)
+                stack.append(child)
+        return element
 
+    def get_nodes(self):
+        """
+        Функция, возвращающая все узлы дерева в порядке обхода в глубину
+        :return: список узлов типа Node (глубина узла - в поле depth)
+        """
+        if self._max_depth is None:
+            self.update_structure()
+        elif self._nodes is None:
+            self.update_nodes()
+        return self._nodes
+
+    def get_leaves(self):
+        """
+        Функция, возвращающая листья дерева в порядке обхода в глубину
+        :return: список узлов типа Node без дочерних элементов
+        """
+        if self._max_depth is None:
+            self.update_structure()
+        elif self._leaves is None:
+            self.update_nodes()
+        return self._leaves
 
+    def get_node(self, identifier):
+        """
+        Функция, возвращающая узел дерева по идентификатору
+        :return: узел типа Node или None, если узла с таким идентификатором нет
+        """
+        if self._index is None:
+            self.update_structure()
+        return self._index.get(identifier)
 
+    def get_parent(self, element):
+        """ Функция, возвращающая родительский узел элемента element (None для корня) """
+        if self._parent_ids is None:
+            self.update_structure()
+        return self._index.get(self._parent_ids.get(element.identifier))
 
+    def get_position(self, element):
+        """ Функция, возвращающая номер элемента element в списке children его родительского узла """
+        if self._positions is None:
+            self.update_structure()
+        return self._positions.get(element.identifier)
 
+    def get_max_depth(self):
+        """
+        Функция, находящая максимальную глубину дерева элементов
+        :return: максимальная глубина дерева элементов
+        """
+        if self._max_depth is None:
+            self.update_structure()
+        return self._max_depth
@@ -1,22 +1,42 @@
+from fitness_functions import FitnessFunctions
+
+
 class PopulationAlgorithms:
     """
     Класс, реализующий основные операторы миграции агентов (элементов интерфейса), свойственные для все реализованных
-    популяционных алгоритмов
+    популяционных алгоритмов.
+    Если передано дерево tree, узлы изменяются с копированием при записи (Tree.writable), а функции возвращают
+    изменённый узел, который следует использовать вместо переданного
     """
-    def change_child_x(self, element, value):
+    def change_child_x(self, element, value, tree=None):
         """ Функция, изменяющая координату x (left) всем дочерним узлам на указанное значение """
+        if tree is not None:
+            # Нулевой сдвиг не меняет узлы - не копируем их
+            if not value:
+                return element
+            element = tree.writable_subtree(element)
         element.left += value
+        # Все дочерние узлы уже принадлежат дереву tree
         for child in element.children:
             self.change_child_x(child, value)
+        return element
 
-    def change_child_y(self, element, value):
+    def change_child_y(self, element, value, tree=None):
         """ Функция, изменяющая координату y (top) всем дочерним узлам на указанное значение """
+        if tree is not None:
+            if not value:
+                return element
+            element = tree.writable_subtree(element)
         element.top += value
         for child in element.children:
             self.change_child_y(child, value)
+        return element
 
-    def change_elements_x(self, elements, i, j):
-        """ Функция, изменяющая положение i-ого и j-ого (и всех, что между ними) элементов списка children по оси x """
+    def change_elements_x(self, elements, i, j, tree=None):
+        """
+        Функция, изменяющая положение i-ого и j-ого (и всех, что между ними) элементов списка children по оси x
+        (при копировании при записи elements - список children изменяемого узла дерева tree)
+        """
         if elements[i].left == elements[j].left:
             return
         min_x = min(elements[i].left, elements[j].left)
@@ -25,19 +45,22 @@ class PopulationAlgorithms:
             correction = elements[j].width - elements[i].width
             for child in elements:
                 if (child.left > min_x) and (child.left < max_x):
-                    self.change_child_x(child, correction)
-            self.change_child_x(elements[i], elements[j].left + correction - elements[i].left)
-            self.change_child_x(elements[j], min_x - elements[j].left)
+                    self.change_child_x(child, correction, tree)
+            self.change_child_x(elements[i], elements[j].left + correction - elements[i].left, tree)
+            self.change_child_x(elements[j], min_x - elements[j].left, tree)
         else:
             correction = elements[i].width - elements[j].width
             for child in elements:
                 if (child.left > min_x) and (child.left < max_x):
-                    self.change_child_x(child, correction)
-            self.change_child_x(elements[j], elements[i].left + correction - elements[j].left)
-            self.change_child_x(elements[i], min_x - elements[i].left)
+                    self.change_child_x(child, correction, tree)
+            self.change_child_x(elements[j], elements[i].left + correction - elements[j].left, tree)
+            self.change_child_x(elements[i], min_x - elements[i].left, tree)
 
-    def change_elements_y(self, elements, i, j):
-        """ Функция, изменяющая положение i-ого и j-ого (и всех, что между ними) элементов списка children по оси y """
+    def change_elements_y(self, elements, i, j, tree=None):
+        """
+        Функция, изменяющая положение i-ого и j-ого (и всех, что между ними) элементов списка children по оси y
+        (при копировании при записи elements - список children изменяемого узла дерева tree)
+        """
         if elements[i].top == elements[j].top:
             return
         min_y = min(elements[i].top, elements[j].top)
@@ -46,21 +69,70 @@ class PopulationAlgorithms:
             correction = elements[j].height - elements[i].height
             for child in elements:
                 if (child.top > min_y) and (child.top < max_y):
-                    self.change_child_y(child, correction)
-            self.change_child_y(elements[i], elements[j].top + correction - elements[i].top)
-            self.change_child_y(elements[j], min_y - elements[j].top)
+                    self.change_child_y(child, correction, tree)
+            self.change_child_y(elements[i], elements[j].top + correction - elements[i].top, tree)
+            self.change_child_y(elements[j], min_y - elements[j].top, tree)
         else:
             correction = elements[i].height - elements[j].height
             for child in elements:
                 if (child.top > min_y) and (child.top < max_y):
-                    self.change_child_y(child, correction)
-            self.change_child_y(elements[j], elements[i].top + correction - elements[j].top)
-            self.change_child_y(elements[i], min_y - elements[i].top)
+                    self.change_child_y(child, correction, tree)
+            self.change_child_y(elements[j], elements[i].top + correction - elements[j].top, tree)
+            self.change_child_y(elements[i], min_y - elements[i].top, tree)
 
-    def change_elements(self, element, i, j):
+    def change_elements(self, element, i, j, tree=None):
         """ Функция, изменяющая положение i-ого и j-ого (и всех, что между ними) элементов списка children """
-        self.change_elements_x(element.children, i, j)
-        self.change_elements_y(element.children, i, j)
+        if tree is not None:
+            element = tree.writable(element)
+        self.change_elements_x(element.children, i, j, tree)
+        self.change_elements_y(element.children, i, j, tree)
+        return element
+
+    @staticmethod
+    def get_movable_elements(tree):
+        """
+        Функция, возвращающая идентификаторы узлов, дочерние элементы которых можно менять местами
+        (не менее двух дочерних элементов, из которых хотя бы один - не пункт меню li)
+        """
+        return [element.identifier for element in tree.get_nodes()
+                if len(element.children) > 1 and any(child.tag_name != "li" for child in element.children)]
+
+    def take_children_positions(self, tree, identifier, partner):
+        """
+        Функция, перемещающая дочерние элементы узла identifier дерева tree (с копированием при записи) в положения
+        соответствующих элементов дерева partner той же структуры
+        :return: True, если хотя бы один элемент был перемещён
+        """
+        element = tree.get_node(identifier)
+        partner_children = partner.get_node(identifier).children
+
+        moved = False
+        for child, partner_child in zip(list(element.children), partner_children):
+            if child.left != partner_child.left or child.top != partner_child.top:
+                child = self.change_child_x(child, partner_child.left - child.left, tree)
+                self.change_child_y(child, partner_child.top - child.top, tree)
+                moved = True
+        return moved
+
+    def estimate_ff_values(self, trees, scale_x, scale_y, width, height, destination_heatmap, iteration,
+                           ff_cache=None, ff_pool=None, heatmap_trackers=None):
+        """
+        Функция, оценивающая приспособленность всех особей (агентов) поколения одним пакетом
+        :param ff_pool: FitnessPool - особи оцениваются параллельно в пуле процессов
+        :param heatmap_trackers: HeatmapTracker для каждой особи (в порядке trees) - перерисовываются только области
+                                 элементов, перемещённых относительно последнего оценённого трекером дерева
+        :return: список значений фитнесс-функции в порядке trees
+        """
+        if ff_pool:
+            return ff_pool.estimate_ff_values(trees, scale_x, scale_y, ff_cache)
+
+        heatmap_trackers = heatmap_trackers or [None] * len(trees)
+        ff_values = []
+        for tree, heatmap_tracker in zip(trees, heatmap_trackers):
+            ff_values.append(FitnessFunctions.estimate_ff_value(tree, scale_x, scale_y, width, height,
+                                                                destination_heatmap, iteration, heatmap_tracker,
+                                                                ff_cache))
+        return ff_values
 
 
 
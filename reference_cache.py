@@ -0,0 +1,112 @@
+import hashlib, os, tempfile, zipfile
+
+import numpy
+from PIL import Image
+
+from engine import FITNESS_MODES, Reference, load_reference
+from heatmap_renderer import get_renderer
+
+CACHE_VERSION = 1  # увеличивается при изменении формата записей или способа построения эталонных карт
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                         "interface_opt")
+HASH_BLOCK_SIZE = 2 ** 20  # количество байт файла интерфейса, хэшируемых за один раз
+
+
+class ReferenceCache:
+    """
+    Класс, хранящий на диске подготовленные эталонные интерфейсы (Reference): эталонную тепловую карту или поле
+    интенсивности тепла и энергию системы зарядов в виде сжатых numpy массивов.
+    Ключ записи - хэш содержимого файла интерфейса, размеров холста, способа сравнения и параметров построения
+    тепловых карт, поэтому изменённый файл или другие параметры не получают устаревшую запись. Записи создаются
+    переименованием временного файла, поэтому кэш могут одновременно использовать несколько процессов
+    """
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_file_hash(file_name):
+        """ Функция, возвращающая хэш содержимого файла интерфейса (файл считывается частями) """
+        file_hash = hashlib.blake2b(digest_size=16)
+        with open(file_name, "rb") as data_file:
+            for block in iter(lambda: data_file.read(HASH_BLOCK_SIZE), b""):
+                file_hash.update(block)
+        return file_hash.digest()
+
+    def get_path(self, file_hash, width, height, fitness):
+        """ Функция, возвращающая путь к записи кэша для эталона с хэшем file_hash """
+        key = hashlib.blake2b(file_hash, digest_size=16)
+        key.update(repr((CACHE_VERSION, width, height, fitness, get_renderer().get_parameters())).encode("utf-8"))
+        key = key.hexdigest()
+        return os.path.join(self.directory, key[:2], key + ".npz")
+
+    @staticmethod
+    def read(path, width, height, fitness):
+        """ Функция, считывающая запись кэша (None, если записи нет или она повреждена) """
+        try:
+            with numpy.load(path) as entry:
+                destination, scale, energy = entry["destination"], entry["scale"], entry["energy"]
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+
+        if fitness == "heatmap":
+            destination = Image.fromarray(destination)
+        else:
+            destination = destination.astype(numpy.float64)
+        return Reference(width, height, scale[0].item(), scale[1].item(), {fitness: destination}, energy.item())
+
+    @staticmethod
+    def write(path, reference, fitness):
+        """ Функция, сохраняющая эталон в запись кэша (если каталог кэша недоступен - эталон просто не сохраняется) """
+        destination = reference.destination_heatmaps[fitness]
+        if fitness == "heatmap":
+            destination = numpy.asarray(destination)
+        elif numpy.array_equal(destination, numpy.clip(numpy.round(destination), 0, 255)):
+            # Поле интенсивности PIL реализации состоит из целых значений от 0 до 255
+            destination = destination.astype(numpy.uint8)
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            entry_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False)
+        except OSError:
+            return
+
+        # Запись появляется целиком: другой процесс видит либо прежнее состояние, либо готовый файл
+        try:
+            with entry_file:
+                numpy.savez_compressed(entry_file, destination=destination,
+                                       scale=numpy.array([reference.scale_x, reference.scale_y]),
+                                       energy=numpy.array(reference.energy))
+            os.replace(entry_file.name, path)
+        except OSError:
+            os.remove(entry_file.name)
+
+    def get_reference(self, file_name, width, height, fitness_modes=FITNESS_MODES):
+        """
+        Функция, возвращающая подготовленный эталонный интерфейс из кэша; отсутствующие записи вычисляются
+        (эталон загружается только в этом случае) и сохраняются
+        :param file_name: JSON файл или двоичный снимок эталонного интерфейса
+        :param fitness_modes: способы сравнения тепловых карт, для которых нужна эталонная карта
+        :return: Reference
+        """
+        file_hash = self.get_file_hash(file_name)
+        reference = None
+        initial_tree = None
+        for fitness in fitness_modes:
+            path = self.get_path(file_hash, width, height, fitness)
+            entry = self.read(path, width, height, fitness)
+            if entry is None:
+                self.misses += 1
+                if initial_tree is None:
+                    initial_tree = load_reference(file_name)
+                entry = Reference.from_tree(initial_tree, width, height, (fitness,))
+                self.write(path, entry, fitness)
+            else:
+                self.hits += 1
+
+            if reference is None:
+                reference = entry
+            else:
+                reference.destination_heatmaps.update(entry.destination_heatmaps)
+        return reference
@@ -0,0 +1,195 @@
+"""
+Двоичный снимок дерева элементов интерфейса: столбцы фиксированной ширины, которые отображаются в память
+(numpy.memmap) без разбора узлов. Несколько процессов, открывших один снимок, разделяют одни и те же страницы файла.
+
+Формат (все числа - little-endian, каждый столбец выровнен на 8 байт):
+    заголовок (HEADER_DTYPE): сигнатура, версия, признаки, количество узлов n, строк m и байт строк
+    left, top, width, height        - float64[n], координаты и размеры узлов
+    identifier, parent, subtree_end - int64[n], идентификатор, номер родителя (-1 у корня), конец поддерева
+    depth                           - int64[n], глубина узла
+    tag_name, id_name, class_name   - int32[n], номера строк в таблице строк
+    child_offsets, child_indexes    - int64[n + 1] и int64[n - 1], номера дочерних узлов (i-ому узлу
+                                      принадлежат child_indexes[child_offsets[i]:child_offsets[i + 1]])
+    string_offsets, string_data     - int64[m + 1] и uint8, таблица различных строк в кодировке UTF-8
+Узлы пронумерованы в порядке обхода в глубину, как в Layout (файл layout.py)
+"""
+
+import numpy
+
+from node import Node, Tree
+from layout import Layout
+
+MAGIC = b"IFOSNAP\0"
+VERSION = 1
+INTEGRAL_GEOMETRY = 1  # признак: все координаты и размеры - целые числа (как во входных JSON файлах)
+
+HEADER_DTYPE = numpy.dtype([("magic", "S8"), ("version", "<u4"), ("flags", "<u4"), ("nodes", "<u8"),
+                            ("strings", "<u8"), ("string_bytes", "<u8")])
+
+# Столбцы снимка: название, тип и длина в зависимости от количества узлов n, строк m и байт строк
+COLUMNS = (
+    ("left", "<f8", lambda n, m, size: n),
+    ("top", "<f8", lambda n, m, size: n),
+    ("width", "<f8", lambda n, m, size: n),
+    ("height", "<f8", lambda n, m, size: n),
+    ("identifier", "<i8", lambda n, m, size: n),
+    ("parent", "<i8", lambda n, m, size: n),
+    ("subtree_end", "<i8", lambda n, m, size: n),
+    ("depth", "<i8", lambda n, m, size: n),
+    ("tag_name", "<i4", lambda n, m, size: n),
+    ("id_name", "<i4", lambda n, m, size: n),
+    ("class_name", "<i4", lambda n, m, size: n),
+    ("child_offsets", "<i8", lambda n, m, size: n + 1),
+    ("child_indexes", "<i8", lambda n, m, size: max(n - 1, 0)),
+    ("string_offsets", "<i8", lambda n, m, size: m + 1),
+    ("string_data", "u1", lambda n, m, size: size),
+)
+
+
+def _aligned(offset):
+    """ Функция, выравнивающая смещение столбца на 8 байт """
+    return (offset + 7) // 8 * 8
+
+
+def _column_offsets(nodes, strings, string_bytes):
+    """
+    Функция, вычисляющая расположение столбцов в файле
+    :return: список кортежей (название, тип, смещение, длина)
+    """
+    offsets = []
+    offset = _aligned(HEADER_DTYPE.itemsize)
+    for name, dtype, length in COLUMNS:
+        count = length(nodes, strings, string_bytes)
+        offsets.append((name, numpy.dtype(dtype), offset, count))
+        offset = _aligned(offset + count * numpy.dtype(dtype).itemsize)
+    return offsets
+
+
+class _Children:
+    """ Последовательность номеров дочерних узлов каждого узла, хранящихся в снимке (как Layout.children) """
+    def __init__(self, offsets, indexes):
+        self.offsets = offsets
+        self.indexes = indexes
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.indexes[self.offsets[index]:self.offsets[index + 1]]
+
+
+class Snapshot:
+    """
+    Класс, описывающий отображённый в память двоичный снимок дерева: столбцы - numpy массивы только для чтения,
+    данные которых считываются с диска при первом обращении. При передаче в другой процесс снимок передаётся
+    именем файла и отображается в память заново
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.data = numpy.memmap(file_name, dtype=numpy.uint8, mode="r")
+
+        header = self.data[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+        if header["magic"] != MAGIC.rstrip(b"\0") or header["version"] != VERSION:
+            raise ValueError("{} is not an interface snapshot of version {}".format(file_name, VERSION))
+        self.integral = bool(header["flags"] & INTEGRAL_GEOMETRY)
+        self.count = int(header["nodes"])
+
+        for name, dtype, offset, count in _column_offsets(self.count, int(header["strings"]),
+                                                          int(header["string_bytes"])):
+            setattr(self, name, self.data[offset:offset + count * dtype.itemsize].view(dtype))
+        self._strings = None
+
+    def __reduce__(self):
+        return Snapshot, (self.file_name,)
+
+    @property
+    def strings(self):
+        """ Таблица строк снимка (декодируется при первом обращении) """
+        if self._strings is None:
+            data = self.string_data.tobytes()
+            offsets = self.string_offsets.tolist()
+            self._strings = [data[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+        return self._strings
+
+    def to_layout(self):
+        """
+        Функция, возвращающая Layout снимка без создания узлов Node: структура дерева и размеры остаются
+        отображёнными в память, копируются только изменяемые координаты (left и top)
+        """
+        li = self.strings.index("li") if "li" in self.strings else -1
+        return Layout(numpy.array(self.left), numpy.array(self.top), self.width, self.height, self.subtree_end,
+                      self.parent, self.depth, self.identifier, _Children(self.child_offsets, self.child_indexes),
+                      self.tag_name == li)
+
+    def to_tree(self):
+        """ Функция, создающая дерево элементов типа Tree (файл node.py) по столбцам снимка """
+        geometry = numpy.column_stack((self.left, self.top, self.width, self.height))
+        if self.integral:
+            geometry = geometry.astype(numpy.int64)
+        strings = self.strings
+
+        nodes = [Node(strings[tag_name], strings[id_name], strings[class_name], width, height, top, left, identifier)
+                 for (left, top, width, height), tag_name, id_name, class_name, identifier in
+                 zip(geometry.tolist(), self.tag_name.tolist(), self.id_name.tolist(), self.class_name.tolist(),
+                     self.identifier.tolist())]
+        # Узлы пронумерованы в порядке обхода в глубину, поэтому дочерние узлы добавляются в исходном порядке
+        for node, parent in zip(nodes[1:], self.parent[1:].tolist()):
+            nodes[parent].add_child(node)
+
+        tree = Tree(nodes[0])
+        tree.update_structure()
+        return tree
+
+
+def is_snapshot(file_name):
+    """ Функция, проверяющая по сигнатуре, является ли файл двоичным снимком """
+    with open(file_name, "rb") as data_file:
+        return data_file.read(len(MAGIC)) == MAGIC
+
+
+def load_snapshot(file_name):
+    """ Функция, отображающая двоичный снимок в память """
+    return Snapshot(file_name)
+
+
+def save_snapshot(tree, file_name):
+    """
+    Функция, сохраняющая дерево элементов в двоичный снимок
+    :param tree: дерево элементов типа Tree
+    :param file_name: путь к создаваемому файлу
+    """
+    layout = Layout.from_tree(tree)
+    nodes = tree.get_nodes()
+
+    # Таблица различных строк: одинаковые названия тегов и классов хранятся один раз
+    table = {}
+    names = {name: numpy.array([table.setdefault(getattr(element, name), len(table)) for element in nodes],
+                               dtype=numpy.int32) for name in ("tag_name", "id_name", "class_name")}
+    encoded = [(string or "").encode("utf-8") for string in table]
+    string_offsets = numpy.concatenate(([0], numpy.cumsum([len(string) for string in encoded], dtype=numpy.int64)))
+
+    child_counts = numpy.array([len(children) for children in layout.children], dtype=numpy.int64)
+    child_offsets = numpy.concatenate(([0], numpy.cumsum(child_counts)))
+    child_indexes = numpy.concatenate(layout.children) if len(nodes) > 1 else numpy.zeros(0)
+
+    geometry = numpy.column_stack((layout.left, layout.top, layout.width, layout.height)).astype(numpy.float64)
+    columns = dict(names, left=geometry[:, 0], top=geometry[:, 1], width=geometry[:, 2], height=geometry[:, 3],
+                   identifier=layout.identifier, parent=layout.parent, subtree_end=layout.subtree_end,
+                   depth=layout.depth, child_offsets=child_offsets, child_indexes=child_indexes,
+                   string_offsets=string_offsets, string_data=numpy.frombuffer(b"".join(encoded), dtype=numpy.uint8))
+
+    header = numpy.zeros(1, dtype=HEADER_DTYPE)
+    header["magic"] = MAGIC
+    header["version"] = VERSION
+    header["flags"] = INTEGRAL_GEOMETRY if numpy.array_equal(geometry, numpy.trunc(geometry)) else 0
+    header["nodes"] = len(nodes)
+    header["strings"] = len(encoded)
+    header["string_bytes"] = int(string_offsets[-1])
+
+    with open(file_name, "wb") as data_file:
+        data_file.write(header.tobytes())
+        for name, dtype, offset, count in _column_offsets(len(nodes), len(encoded), int(string_offsets[-1])):
+            data_file.write(b"\0" * (offset - data_file.tell()))
+            data_file.write(numpy.ascontiguousarray(columns[name], dtype=dtype).tobytes())
@@ -0,0 +1,209 @@
+import json, re
+
+from node import Node, Tree
+
+CHUNK_SIZE = 2 ** 20  # количество символов файла, считываемых за один раз
+INDENT = " " * 4  # отступ одного уровня вложенности в сохраняемых JSON файлах (как json.dump(indent=4))
+
+# Лексема JSON: начало объекта вместе с идущими подряд парами "ключ": значение (строка, число или литерал) и
+# началом списка дочерних элементов, если он следует за ними; отдельная такая пара; ключ вложенного объекта или
+# списка; знак структуры; значение элемента списка. Каждая пара и значение распознаются только вместе со следующим
+# за ними символом, поэтому оборванная на границе части файла лексема не распознаётся
+STRING = r'"([^"\\]*(?:\\.[^"\\]*)*)"'
+SCALAR = STRING + r'|(-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?)|(true|false|null)'
+PAIRS = r'(?:\s*"[^"\\]*(?:\\.[^"\\]*)*"\s*:\s*(?:"[^"\\]*(?:\\.[^"\\]*)*"|[-+.\w]+)(?=\s*[,}])\s*,?)*'
+TOKEN = re.compile(r'\s*(?:\{(' + PAIRS + r')(\s*"children"\s*:\s*\[)?|' +
+                   STRING + r'\s*:\s*(?:' + SCALAR + r')(?=\s*[,}])|' + STRING + r'\s*:(?=\s*[{\[])|' +
+                   r'([}\[\]])|(?:' + SCALAR + r')(?=\s*[,\]]))\s*,?')
+LITERALS = {"true": True, "false": False, "null": None}
+
+
+class _ElementFrame:
+    """ Незавершённый элемент интерфейса на стеке загрузчика: уже считанные свойства и дочерние узлы """
+    __slots__ = ("fields", "identifier", "children", "key", "in_children")
+
+    def __init__(self, identifier, fields):
+        self.fields = fields
+        self.identifier = identifier
+        self.children = []
+        # Ключ, значение которого ожидается, и признак чтения списка дочерних элементов
+        self.key = None
+        self.in_children = False
+
+    def to_node(self):
+        """ Функция, создающая узел типа Node по считанным свойствам элемента """
+        fields = self.fields
+        node = Node(fields["tagName"], fields["id"], fields["className"], fields["clientWidth"],
+                    fields["clientHeight"], fields["clientTop"], fields["clientLeft"], self.identifier)
+        node.children = self.children
+        return node
+
+
+def _scalar(string, number, literal):
+    """ Функция, возвращающая значение строки, числа или литерала JSON """
+    if string is not None:
+        return json.loads('"{}"'.format(string)) if "\\" in string else string
+    if number is not None:
+        return float(number) if any(symbol in number for symbol in ".eE") else int(number)
+    return LITERALS[literal]
+
+
+def _tokens(data_file, chunk_size=CHUNK_SIZE):
+    """
+    Генератор лексем JSON файла, считываемого частями по chunk_size символов
+    :return: кортежи (вид лексемы, ключ, значение) - вид "{" (значение - словарь пар, идущих сразу за началом
+             объекта; ключ - "children", если за ними начинается список дочерних элементов), "pair" (ключ и
+             значение), "key" (ключ вложенного объекта или списка), "item" (значение элемента списка) или знак
+             структуры "}", "[", "]"
+    """
+    buffer = ""
+    position = 0
+    end_of_file = False
+    while True:
+        match = TOKEN.match(buffer, position)
+        # Лексема могла оборваться на границе части файла - дочитываем файл и разбираем её заново
+        if not end_of_file and (match is None or match.end() == len(buffer)):
+            chunk = data_file.read(chunk_size)
+            end_of_file = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        if match is None:
+            if buffer[position:].strip():
+                raise ValueError("Invalid JSON near: {!r}".format(buffer[position:position + 40]))
+            return
+        position = match.end()
+
+        pairs, children, pair_key, pair_string, pair_number, pair_literal, key, punctuation, string, number, literal = \
+            match.groups()
+        if pairs is not None:
+            # Пары начала объекта разбираются за один вызов json.loads
+            yield "{", children and "children", json.loads("{" + pairs.rstrip().rstrip(",") + "}") if pairs else {}
+        elif pair_key is not None:
+            yield "pair", pair_key, _scalar(pair_string, pair_number, pair_literal)
+        elif key is not None:
+            yield "key", key, None
+        elif punctuation:
+            yield punctuation, None, None
+        else:
+            yield "item", None, _scalar(string, number, literal)
+
+
+def load_tree(file_name, chunk_size=CHUNK_SIZE):
+    """
+    Функция, загружающая дерево элементов интерфейса из JSON файла (без использования Qt).
+    Файл считывается частями и сразу превращается в узлы Node: вместо рекурсии - явный стек незавершённых
+    элементов (его глубина равна глубине дерева), промежуточные словари всего документа не создаются.
+    Идентификаторы узлов назначаются в порядке обхода в глубину (корень - 0, остальные узлы - начиная с 1)
+    :param file_name: путь к JSON файлу с описанием интерфейса
+    :param chunk_size: количество символов, считываемых за один раз
+    :return: дерево элементов типа Tree (файл node.py)
+    """
+    stack = []
+    root = None
+    identifier = 0
+    # Глубина вложенности пропускаемого значения (свойства элемента, не используемые в Node)
+    skip_depth = 0
+
+    with open(file_name, encoding="utf-8") as data_file:
+        for kind, key, value in _tokens(data_file, chunk_size):
+            if skip_depth:
+                if kind == "{":
+                    skip_depth += 2 if key else 1
+                elif kind == "[":
+                    skip_depth += 1
+                elif kind in ("}", "]"):
+                    skip_depth -= 1
+                    if not skip_depth:
+                        stack[-1].key = None
+                continue
+
+            top = stack[-1] if stack else None
+            if kind == "pair":
+                if top is None or top.in_children:
+                    raise ValueError("Unexpected property in the interface description: {!r}".format(key))
+                top.fields[key] = value
+            elif kind == "key":
+                if top is None or top.in_children:
+                    raise ValueError("Unexpected property in the interface description: {!r}".format(key))
+                top.key = key
+            elif kind == "{":
+                if (top is None and root is None) or (top is not None and top.in_children):
+                    frame = _ElementFrame(identifier, value)
+                    identifier += 1
+                    # Список дочерних элементов начинается сразу за свойствами элемента
+                    frame.key = key
+                    frame.in_children = key is not None
+                    stack.append(frame)
+                elif top is not None and top.key is not None:
+                    # Пропускаемый объект (вместе с начатым в нём списком)
+                    skip_depth = 2 if key else 1
+                else:
+                    raise ValueError("Unexpected object in the interface description")
+            elif kind == "[":
+                if top is None or top.key is None:
+                    raise ValueError("Unexpected array in the interface description")
+                if top.key == "children":
+                    top.in_children = True
+                else:
+                    skip_depth = 1
+            elif kind == "}":
+                if top is None or top.in_children or top.key is not None:
+                    raise ValueError("Unexpected end of object in the interface description")
+                node = stack.pop().to_node()
+                if stack:
+                    stack[-1].children.append(node)
+                else:
+                    root = node
+            elif kind == "]":
+                if top is None or not top.in_children:
+                    raise ValueError("Unexpected end of array in the interface description")
+                top.in_children = False
+                top.key = None
+            else:
+                raise ValueError("Unexpected value in the interface description: {!r}".format(value))
+
+    if root is None or stack:
+        raise ValueError("Incomplete interface description in {}".format(file_name))
+
+    # Один раз вычисляем глубины узлов, индекс узлов по идентификатору и родительские узлы
+    tree = Tree(root)
+    tree.update_structure()
+    return tree
+
+
+def save_tree(tree, file_name):
+    """
+    Функция, сохраняющая дерево элементов интерфейса в JSON файл того же формата, что и входные файлы (текст тот же,
+    что у json.dump(..., indent=4)). Файл записывается по мере обхода дерева: вместо рекурсии - явный стек узлов
+    и закрывающих скобок, промежуточные словари не создаются
+    :param tree: дерево элементов типа Tree (файл node.py)
+    :param file_name: путь к создаваемому JSON файлу
+    """
+    # Элементы стека: (узел, уровень отступа) или (текст, None) - текст записывается как есть
+    stack = [(tree.root, 0)]
+    with open(file_name, "w") as data_file:
+        while stack:
+            element, depth = stack.pop()
+            if depth is None:
+                data_file.write(element)
+                continue
+
+            indent = INDENT * (depth + 1)
+            fields = (("tagName", element.tag_name), ("id", element.id_name), ("className", element.class_name),
+                      ("clientWidth", element.width), ("clientHeight", element.height),
+                      ("clientTop", element.top), ("clientLeft", element.left))
+            data_file.write("{\n")
+            for key, value in fields:
+                data_file.write('{}"{}": {},\n'.format(indent, key, json.dumps(value)))
+            if not element.children:
+                data_file.write('{}"children": []\n{}}}'.format(indent, INDENT * depth))
+                continue
+
+            # Дочерние элементы записываются в исходном порядке: в стек они кладутся с конца
+            data_file.write('{}"children": [\n'.format(indent))
+            stack.append(("\n{}]\n{}}}".format(indent, INDENT * depth), None))
+            for position in range(len(element.children) - 1, -1, -1):
+                stack.append((element.children[position], depth + 2))
+                stack.append(((",\n" if position else "") + INDENT * (depth + 2), None))